@@ -0,0 +1,203 @@
+"""
+DB Connection
+
+Connection manager for the MongoDB server: a single shared client, a lightweight health check ('ping'), and
+reconnection with jittered exponential backoff.
+
+After a connection is lost, attempts are spaced by a random delay between 0 and base_delay*2^attempts
+seconds (capped at max_delay), so a fleet of boards reconnecting after a server restart does not stampede
+the database.
+
+Connection states:
+    DISCONNECTED: The connection has been lost, or never established, see retryDue().
+    CONNECTED: The last operation or health check succeeded.
+"""
+
+import random
+import threading
+import time
+import pymongo
+from pymongo import errors
+
+DBConnection_version = "1.0 Build 1"
+
+DISCONNECTED = 'disconnected'
+CONNECTED = 'connected'
+
+# Client options, keeping health checks and operations from blocking the sampling loop for long
+CLIENT_OPTIONS = {
+    'connectTimeoutMS': 5000,
+    'socketTimeoutMS': 30000,
+    'serverSelectionTimeoutMS': 5000,
+    'maxPoolSize': 4
+}
+# Options understood by older pymongo versions
+LEGACY_CLIENT_OPTIONS = {
+    'connectTimeoutMS': 5000,
+    'socketTimeoutMS': 30000,
+    'max_pool_size': 4
+}
+
+
+class ConnectionManager:
+    def __init__(self, server, username="", password="", base_delay=1.0, max_delay=300.0):
+        """
+        Manages the connection to the MongoDB server at 'server'. No connection is made until connect().
+
+        Required Arguments:
+            server (str): Server's URL or IP Address.
+
+        Optional Arguments:
+            username (str): DB Server's username. If provided, authentication will be used (on the 'admin'
+            database).
+            password (str): DB Server's password.
+            base_delay (float): Maximum delay before the first attempt after the connection is lost, in
+            seconds (Default 1 second).
+            max_delay (float): Maximum delay between attempts, in seconds (Default 300 seconds).
+        """
+        self.server = server
+        self.username = username
+        self.password = password
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reconnects = 0
+        self.__client = None
+        self.__authenticated = False
+        self.__state = DISCONNECTED
+        self.__attempts = 0
+        self.__retry_at = 0
+        self.__connected_once = False
+        self.__lock = threading.Lock()
+
+    def connect(self, timeout=None):
+        """
+        Connects and authenticates to the server, retrying with backoff, and returns the shared client.
+
+        Args:
+            timeout (float): Time to keep retrying, in seconds, if None retries until connected.
+
+        Returns:
+            MongoClient, or None if could not connect before the timeout.
+
+        Exceptions:
+            Raises OperationFailure if authentication fails, and ConfigurationError if 'server' is invalid.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            try:
+                self.__open()
+                self.__client.admin.command('ping')
+                self.__connected()
+                return self.__client
+            except pymongo.errors.ConnectionFailure:
+                self.connectionLost()
+            if deadline is not None and time.time() >= deadline:
+                return None
+            wait = self.__retry_at - time.time()
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+            time.sleep(max(0.0, wait))
+
+    def client(self):
+        """
+        Returns the shared client, or None if connect() has not succeeded yet.
+        """
+        return self.__client
+
+    def state(self):
+        """
+        Returns the connection state, CONNECTED or DISCONNECTED.
+        """
+        return self.__state
+
+    def isConnected(self):
+        """
+        Returns True if the connection state is CONNECTED.
+        """
+        return self.__state == CONNECTED
+
+    def ping(self):
+        """
+        Checks the connection with the server's 'ping' command, updating the connection state.
+
+        Notes:
+            If connect() did not succeed (e.g. the server was unreachable at startup), the client is created
+            and authenticated first.
+
+        Returns:
+            True if the server replied, False otherwise.
+        """
+        try:
+            self.__open()
+            self.__client.admin.command('ping')
+        except (pymongo.errors.ConnectionFailure, pymongo.errors.OperationFailure):
+            self.connectionLost()
+            return False
+        self.__connected()
+        return True
+
+    def connectionLost(self):
+        """
+        Flags the connection as lost, and schedules the next attempt after a jittered, exponentially
+        growing, delay.
+        """
+        with self.__lock:
+            if self.__state == CONNECTED:
+                self.__attempts = 0
+            self.__state = DISCONNECTED
+            self.__retry_at = time.time() + self.nextDelay()
+            self.__attempts += 1
+
+    def retryDue(self):
+        """
+        Returns True if connected, or if the delay before the next attempt has elapsed.
+        """
+        return self.__state == CONNECTED or time.time() >= self.__retry_at
+
+    def retryAt(self):
+        """
+        Returns the time of the next attempt (UNIX Epoch timestamp), or 0 if connected.
+        """
+        if self.__state == CONNECTED:
+            return 0
+        return self.__retry_at
+
+    def nextDelay(self):
+        """
+        Returns a random delay ('full jitter') for the next attempt, in seconds.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay*2**min(self.__attempts, 30)))
+
+    def close(self):
+        """
+        Closes the shared client.
+        """
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+        self.__authenticated = False
+        self.__state = DISCONNECTED
+
+    def __connected(self):
+        with self.__lock:
+            if self.__state != CONNECTED and self.__connected_once:
+                self.reconnects += 1
+            self.__state = CONNECTED
+            self.__attempts = 0
+            self.__connected_once = True
+
+    def __open(self):
+        # Creates the client, if needed, and authenticates, if not yet authenticated
+        if self.__client is None:
+            self.__client = self.__createClient()
+        if not self.__authenticated and len(self.username.strip()) > 0:
+            self.__client.admin.authenticate(self.username, self.password)
+        self.__authenticated = True
+
+    def __createClient(self):
+        # Creates the client with tuned pool and timeouts, using the options older pymongo versions understand
+        # if needed
+        try:
+            return pymongo.MongoClient(self.server, **CLIENT_OPTIONS)
+        except (pymongo.errors.ConfigurationError, TypeError):
+            return pymongo.MongoClient(self.server, **LEGACY_CLIENT_OPTIONS)
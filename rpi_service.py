@@ -17,8 +17,24 @@ Attributes:
     log_path (str): Path to the log file, appended to old_log_path, then cleared.
     old_log_path (str): Path to the old log file, where current logs are appended to.
     config_path (str): Path to the config file.
-    globalDBClient (MongoClient): DB Client object.
+    spool_path (str): Path to the spool directory, where data points are kept while the DB is unreachable.
+    stats_path (str): Path to the stats file, where per-phase timings are written to.
+    globalDBClient (MongoClient): DB Client object, shared by all DB operations.
+    dbConnection (ConnectionManager): Manages globalDBClient's connection state and reconnection backoff.
     settings (dict): Holds the current settings file.
+    readingWriter (ReadingWriter): Background worker inserting data points on the DB.
+    log_offset (int): Number of bytes of the log file already uploaded to the DB.
+    log_upload_time (float): Time of the last log upload.
+    log_max_lines (int): Maximum number of log lines kept on the DB.
+    log_error_event (Event): Set when an error is logged, so the log is uploaded on the next iteration.
+    settings_check_time (float): Time settings were last checked for updates.
+    heartbeat_time (float): Time the heartbeat was last published.
+    heartbeat_stats (dict): Counters and timings published on the heartbeat, see publishHeartbeat().
+    timings (Timings): Rolling per-phase timings of the sampling loop.
+    stats_time (float): Time the stats file was last written.
+    tty_index (dict): Cached index of serial devices, see getTTYIndex().
+    tty_index_mtime (float): Modification time of sys_tty_path when tty_index was built.
+    STREAM_RECOVERY_TIMEOUT (float): Maximum time to wait for a streaming sensor to stream, see recoverSensor().
 
 """
 
@@ -29,14 +45,21 @@ from bson import json_util
 from bson.objectid import ObjectId
 import sys
 import time
-import urllib2
 import subprocess
 import traceback
 import pymongo
 from pymongo import errors
 import logging
 import os
+import Queue
+import collections
+import threading
 from serialsensor import *
+from spool import Spool
+from timings import Timings
+from scheduler import MultiRateScheduler, MISSED_TICK_POLICIES, SKIP
+from dbconnection import ConnectionManager
+from reachability import parseTargets, waitForTargets
 
 
 #########################################################################################
@@ -57,10 +80,42 @@ base_path = os.path.dirname(os.path.realpath(__file__)) + '/'
 log_path = base_path + 'log.log'
 old_log_path = base_path + 'old_log.log'
 config_path = base_path + 'config.json'
-# DB Client
+spool_path = base_path + 'spool/'
+stats_path = base_path + 'stats.json'
+# DB Client, and its connection manager
 globalDBClient = None
+dbConnection = None
 # Settings
 settings = None
+# Write-behind queue for data points
+readingWriter = None
+# Incremental log upload state
+log_offset = 0
+log_upload_id = None
+log_upload_time = 0
+log_max_lines = 5000
+log_error_event = threading.Event()
+# Time settings were last checked for updates
+settings_check_time = 0
+# Heartbeat state
+heartbeat_time = 0
+heartbeat_stats = {
+    'start_time': time.time(),
+    'last_sample': None,
+    'cycle_duration': None,
+    'sensor_errors': 0,
+    'logged_errors': 0,
+    'restarts': 0
+}
+# Per-phase timings
+timings = Timings()
+stats_time = 0
+# Serial device index
+sys_tty_path = '/sys/class/tty/'
+tty_index = None
+tty_index_mtime = None
+# Maximum time (in seconds) a streaming sensor is given to stream a line when recovering it
+STREAM_RECOVERY_TIMEOUT = 30
 
 
 #########################################################################################
@@ -84,6 +139,13 @@ settings = None
 #########################################################################################
 
 
+class LogErrorHandler(logging.Handler):
+    # Sets log_error_event when an error is logged, so the log is uploaded without waiting for the interval
+    def emit(self, record):
+        heartbeat_stats['logged_errors'] += 1
+        log_error_event.set()
+
+
 # Initializes logger
 def initialize_logger(log_path, old_log_path):
     # Try to find current log, if found, append to old_log
@@ -107,6 +169,7 @@ def initialize_logger(log_path, old_log_path):
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s')
     handler.setFormatter(formatter)
     logger.addHandler(handler)
+    logger.addHandler(LogErrorHandler(logging.ERROR))
     return logger
 
 
@@ -126,33 +189,44 @@ if (os.getuid() != 0):
 #########################################################################################
 
 
-def waitForInternet(wait):
+def waitForServer(settings, wait):
     """
-    Wait for internet connection for a given amount of time.
+    Waits for the DB server, or any of the 'reachability_targets', to accept a TCP connection, for up to
+    'wait' seconds.
 
     Notes:
-        Exits after timeout.
+        Targets are probed in parallel every 10 seconds, see reachability.waitForTargets(), so the DB server
+        can be checked on networks without internet access.
 
     Args:
-        wait (int): Time to keep waiting for internet connection.
+        settings (dict): Settings dictionary, with the 'server' and (optionally) 'reachability_targets' settings.
+        wait (float): Time to keep waiting for a connection, in seconds.
+
+    Returns:
+        bool: True if a target is reachable, False otherwise (including when the server address is invalid).
     """
     try:
-            urllib2.urlopen('http://74.125.228.100', timeout=5)  # Google
-            output("Internet connection established\n", logger.info)
-    except urllib2.URLError:
-        t = 0
+        targets = parseTargets(str(settings['settings']['value']['server']['value']))
+    except ValueError:
+        targets = []
+    if len(targets) == 0:
+        output("Invalid server address: " + str(settings['settings']['value']['server']['value']), logger.error)
+        return False
+    try:
+        targets += parseTargets(str(getSettingValue(settings, 'reachability_targets', '')))
+    except ValueError:
+        output("Invalid reachability targets, ignoring...", logger.error)
+    start_time = time.time()
+    target = waitForTargets(targets, 0)
+    if target is None:
         output("Waiting up to: " + str(wait) + " seconds for connection...", logger.info)
-        while t < wait:
-            try:
-                urllib2.urlopen('http://74.125.228.100', timeout=5)
-                # change this to connect to server (if on intranet)
-                output("Internet connection established after: " + str(t) + " seconds.", logger.info)
-                return
-            except urllib2.URLError:
-                time.sleep(10)
-            t += 15
-        output("No Internet connection, exiting...", logger.info)
-        quit()
+        target = waitForTargets(targets, wait)
+    if target is None:
+        output("Could not reach: " + ', '.join(i[0] + ':' + str(i[1]) for i in targets), logger.error)
+        return False
+    output("Connection established to " + target[0] + ':' + str(target[1]) + " after: " +
+           str(int(time.time() - start_time)) + " seconds.", logger.info)
+    return True
 
 
 def output(message, log_func=None, verbose=True):
@@ -194,6 +268,10 @@ def quit():
             settings['status']['value'] = "Stopped"
         except:
             pass
+        try:
+            readingWriter.stop(timeout=10)
+        except:
+            pass
         try:
             saveSettingsToDB(settings, settings['_id'])
             uploadLog(log_path, settings['_id'])
@@ -219,48 +297,73 @@ def now():
 #########################################################################################
 
 
-def DBConnect(server, username="", password=""):
+def DBConnect(server, username="", password="", timeout=3*60*60, required=True):
     """
     Connects and authenticates to the Mongo DB on the specified server.
     Uses authentication if username provided.
 
     Notes:
-        Authentication uses the 'admin' database.
+        - Authentication uses the 'admin' database.
+        - The client is shared, and reused if server and credentials have not changed. Attempts are spaced
+        with jittered exponential backoff, see ConnectionManager.
+        - Exits script if credentials or server are invalid, or if could not connect within 'timeout' seconds
+        and 'required' is True.
 
     Args:
         server (str): Server's URL or IP Address
         username (str): DB Server's username. If provided, authentication will be used.
         password (str): DB Server's password.
+        timeout (float): Time (in seconds) to keep trying to connect (Default 3 hours).
+        required (bool): If False, returns None instead of exiting if could not connect, dbConnection then
+        keeps retrying in the background (see ReadingWriter).
 
     Returns:
-        DB Client (MongoClient).
+        DB Client (MongoClient), or None.
     """
+    global dbConnection
+    if dbConnection is None or (dbConnection.server, dbConnection.username, dbConnection.password) != \
+            (server, username, password):
+        if dbConnection is not None:
+            dbConnection.close()
+        dbConnection = ConnectionManager(server, username, password)
     try:
-        client = pymongo.MongoClient(server)
-        if len(username.strip()) > 0:
-            client.admin.authenticate(username, password)
-        output("Connected to " + client.host, logger.info)
-        return client
-    except pymongo.errors.ConnectionFailure:
+        client = dbConnection.connect(timeout)
+    except (pymongo.errors.OperationFailure, pymongo.errors.ConfigurationError):
         output("Configuration error, please check settings. Exiting.", logger.error)
         sys.exit(0)  # Don't bother with quit(), no connection anyway
-    except pymongo.errors.ConnectionFailure:
+    if client is None:
         output('Could not connect to MongoDB at: "' + server + '"', logger.error)
-        raise
+        if not required:
+            return None
+        sys.exit(0)  # Don't bother with quit(), no connection anyway
+    output("Connected to " + server, logger.info)
+    return client
 
 
 def insertReading(data, settings):
     """
-    Inserts data point to DB and Collection defined in settings.
+    Queues data point to be inserted to DB and Collection defined in settings.
+
+    Notes:
+        - Data points are inserted in batches by the readingWriter worker, if it has not been started the
+        data point is inserted immediately.
+        - If the 'storage_mode' setting is 'bucket', data points are stored on buckets of 'bucket_size'
+        seconds, see insertBuckets().
 
     Args:
         data(JSON serializable dict): Data point.
         settings (dict): Current settings dictionary.
     """
-    return insertData(data,
-                      settings['settings']['value']['db_name']['value'],
-                      settings['settings']['value']['collection_name']['value']
-                      )
+    db = settings['settings']['value']['db_name']['value']
+    collection = settings['settings']['value']['collection_name']['value']
+    bucket = None
+    if str(getSettingValue(settings, 'storage_mode', 'document')).strip().lower() == 'bucket':
+        bucket = (str(settings['_id']), int(getSettingValue(settings, 'bucket_size', 3600)))
+    if readingWriter is None:
+        if bucket is None:
+            return insertData(data, db, collection)
+        return insertBuckets([data], db, collection, bucket[0], bucket[1])
+    readingWriter.put(data, db, collection, bucket)
 
 
 def insertData(data, db, collection):
@@ -268,7 +371,7 @@ def insertData(data, db, collection):
     Inserts data point on the 'collection' collection at the 'db' database on the globalDBClient.
 
     Args:
-        data (JSON serializable dict): Data point.
+        data (JSON serializable dict or list): Data point, or list of data points to be bulk inserted.
         db (str): Database where 'data' will be inserted.
         collection (str): Collection where 'data' will be inserted.
     """
@@ -279,6 +382,74 @@ def insertData(data, db, collection):
         return None
 
 
+def insertBuckets(data, db, collection, board, bucket_size):
+    """
+    Stores data points on bucket documents in the 'collection' collection at the 'db' database on the
+    globalDBClient, one bucket per board, per 'bucket_size' seconds window, and per set of measurement names.
+
+    Bucket document format, with values in the same order as dates:
+
+        {
+        "board": ObjectId(board),
+        "start": 1420070400, "end": 1420074000,
+        "fields": ["CO2", "Temperature"],
+        "units": {"CO2": "ppm", "Temperature": "C"},
+        "date": [1420070412.5, 1420070472.5, ...],
+        "values": {"CO2": [443.0, 445.0, ...], "Temperature": [25.3, 25.4, ...]},
+        "count": 2
+        }
+
+    Units are stored only once per bucket. Use expandBucket() to get the data points back.
+
+    Args:
+        data (list): Data points, in the format {name: {"value": value, "units": units}, ..., "date": date}.
+        db (str): Database where 'data' will be stored.
+        collection (str): Collection where 'data' will be stored.
+        board (str or ObjectId): Board Id.
+        bucket_size (int): Time window of each bucket (in seconds).
+    """
+    buckets = collections.OrderedDict()
+    for i in data:
+        start = int(i['date'] // bucket_size) * bucket_size
+        fields = tuple(sorted(key for key in i if key not in ('date', '_id')))
+        buckets.setdefault((start, fields), []).append(i)
+    try:
+        for (start, fields), readings in buckets.iteritems():
+            update = {
+                '$setOnInsert': {'end': start + bucket_size,
+                                 'units': dict((j, readings[0][j]['units']) for j in fields)},
+                '$push': {'date': {'$each': [i['date'] for i in readings]}},
+                '$inc': {'count': len(readings)}
+            }
+            for j in fields:
+                update['$push']['values.' + j] = {'$each': [i[j]['value'] for i in readings]}
+            globalDBClient[db][collection].update({'board': ObjectId(board), 'start': start, 'fields': list(fields)},
+                                                  update, upsert=True)
+        return True
+    except pymongo.errors.OperationFailure:
+        output("Error saving data to DB", logger.error)
+        return None
+
+
+def expandBucket(bucket):
+    """
+    Returns the data points stored on a bucket document (see insertBuckets()), in the same format as
+    documents inserted by insertData():
+
+        [{name: {"value": value, "units": units}, ..., "date": date}, ...]
+
+    Args:
+        bucket (dict): Bucket document.
+    """
+    data = []
+    for i in range(len(bucket['date'])):
+        point = {'date': bucket['date'][i]}
+        for j in bucket['fields']:
+            point[j] = {'value': bucket['values'][j][i], 'units': bucket['units'][j]}
+        data.append(point)
+    return data
+
+
 def updateData(key, data, db, collection):
     """
     Tries to update 'key' on the 'collection' collection at the 'db' database on the globalDBClient with
@@ -301,7 +472,7 @@ def updateData(key, data, db, collection):
         return None
 
 
-def getData(key, db, collection):
+def getData(key, db, collection, projection=None):
     """
     Gets data from the 'collection' collection at the 'db' database on the globalDBClient.
 
@@ -309,9 +480,10 @@ def getData(key, db, collection):
         key (string or ObjectId): Key used to find the document in the collection.
         db (str): Database where 'key' will be compared.
         collection (str): Collection where 'key' will be compared.
+        projection (dict, optional): Fields to be returned, if None the whole document is returned.
     """
     try:
-        return globalDBClient[db][collection].find_one({'_id': ObjectId(key)})
+        return globalDBClient[db][collection].find_one({'_id': ObjectId(key)}, projection)
     except pymongo.errors.OperationFailure:
         output("Error getting data from DB", logger.error)
         return None
@@ -335,23 +507,62 @@ def updateConfigData(key, data):
     return updateData(key, data, 'admin', 'boards')
 
 
-def updateLogData(key, text):
+def updateLogData(key, lines):
     """
     Tries to update 'key' on the 'log' collection at the 'admin' database on the globalDBClient with
-    'text', if not found, insert new with 'key' Id.
+    'lines', if not found, insert new with 'key' Id.
 
     If another database or collection is to be used to store logs change the values below. Note that the
     web_management interface also depends on these values.
 
     Args:
         key (string or ObjectId): Key used to find the document in the collection.
-        text (str): Log file as string.
+        lines (list): Log file lines, without line endings.
+
+    Notes:
+        'total' counts the lines uploaded since the entry was replaced, the web_management interface uses
+        it to address lines while older ones are dropped.
     """
-    data = {'_id': ObjectId(key), 'contents': text}  # Force use of a specific Id if inserting new entry.
+    data = {'_id': ObjectId(key), 'lines': lines, 'total': len(lines)}  # Force use of a specific Id if inserting new entry.
     return updateData(key, data, 'admin', 'log')
 
 
-def getConfigData(key):
+def appendLogData(key, lines, max_lines):
+    """
+    Appends 'lines' to the log entry 'key' on the 'log' collection at the 'admin' database on the
+    globalDBClient, keeping only the newest 'max_lines' lines. If not found, insert new with 'key' Id.
+
+    Args:
+        key (string or ObjectId): Key used to find the document in the collection.
+        lines (list): New log file lines, without line endings.
+        max_lines (int): Maximum number of lines kept on the log entry.
+    """
+    try:
+        return globalDBClient['admin']['log'].update({'_id': ObjectId(key)},
+                                                     {'$push': {'lines': {'$each': lines, '$slice': -max_lines}},
+                                                      '$inc': {'total': len(lines)}},
+                                                     upsert=True)
+    except pymongo.errors.OperationFailure:
+        output("Error saving data to DB", logger.error)
+        return None
+
+
+def updateHeartbeatData(key, data):
+    """
+    Tries to update 'key' on the 'heartbeat' collection at the 'admin' database on the globalDBClient with
+    'data', if not found, insert new with 'key' Id.
+
+    Note that the web_management interface also depends on these values.
+
+    Args:
+        key (string or ObjectId): Key used to find the document in the collection.
+        data (dict): Heartbeat, see publishHeartbeat().
+    """
+    data['_id'] = ObjectId(key)  # Force use of a specific Id if inserting new entry.
+    return updateData(key, data, 'admin', 'heartbeat')
+
+
+def getConfigData(key, projection=None):
     """
     Gets data from the 'boards' collection at the 'admin' database on the globalDBClient.
 
@@ -360,8 +571,9 @@ def getConfigData(key):
 
     Args:
         key (string or ObjectId): Key used to find the document in the collection.
+        projection (dict, optional): Fields to be returned, if None the whole document is returned.
     """
-    return getData(key, 'admin', 'boards')
+    return getData(key, 'admin', 'boards', projection)
 
 
 def getDBCount(db, collection):
@@ -375,14 +587,255 @@ def getDBCount(db, collection):
     return globalDBClient[db][collection].count()
 
 
+class ReadingWriter(threading.Thread):
+    """
+    Background worker that inserts data points on the DB in batches (write-behind queue).
+
+    Data points queued with put() are grouped by database, collection and bucket, and bulk inserted once
+    'batch_size' data points are pending, or once the oldest pending data point has waited for
+    'max_latency' seconds. The sampling loop only queues data points, and never waits on the DB.
+
+    Notes:
+        If the connection to the DB is lost, pending data points are written to 'spool' (if provided,
+        otherwise kept in memory) and the connection is checked with dbConnection's backoff. Once
+        the connection is restablished the spool is replayed, in order, before new data points are inserted.
+        Data points stored on buckets (see insertBuckets()) may be stored twice if the connection is lost
+        while they are being inserted.
+        Unexpected errors are logged, and inserts (or spool writes, if writing to the spool failed) are
+        retried after 'error_retry_interval' seconds. Data points that can be neither inserted nor spooled
+        are kept in memory, up to 'max_pending' of them, older ones are dropped.
+
+    Args:
+        batch_size (int): Number of pending data points that triggers a bulk insert.
+        max_latency (float): Maximum time (in seconds) a data point may wait before being inserted.
+        spool (Spool): On-disk spool used while the DB cannot be reached.
+        error_retry_interval (float): Time (in seconds) to wait before retrying after an unexpected error.
+        max_pending (int): Maximum number of data points kept in memory.
+    """
+    def __init__(self, batch_size=10, max_latency=30.0, spool=None, error_retry_interval=30.0, max_pending=10000):
+        threading.Thread.__init__(self, name="ReadingWriter")
+        self.daemon = True
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.error_retry_interval = error_retry_interval
+        self.max_pending = max_pending
+        self.__spool = spool
+        self.__error_retry_at = 0  # Inserts are held until then after an unexpected error
+        self.__spool_retry_at = 0  # Spool writes are held until then after a failed write
+        self.__queue = Queue.Queue()
+        self.__batches = collections.OrderedDict()  # {(db, collection, bucket): [data, ...], ...}
+        self.__pending = 0
+        self.__oldest = None
+        self.__stopping = threading.Event()
+
+    def put(self, data, db, collection, bucket=None):
+        """
+        Queues data point to be inserted on the 'collection' collection at the 'db' database.
+
+        Args:
+            bucket (tuple): (board Id, bucket size) to store the data point on buckets with insertBuckets(),
+            if None the data point is inserted as a document.
+        """
+        self.__queue.put((time.time(), data, db, collection, bucket))
+
+    def qsize(self):
+        """
+        Returns the approximate number of data points not yet inserted, not counting spooled ones.
+        """
+        return self.__queue.qsize() + self.__pending
+
+    def spoolSize(self):
+        """
+        Returns the size of the spool on disk, in bytes.
+        """
+        if self.__spool is None:
+            return 0
+        return self.__spool.size()
+
+    def isConnected(self):
+        """
+        Returns False if the connection to the DB has been lost and not yet restablished, True otherwise.
+        """
+        return dbConnection.isConnected()
+
+    def connectionLost(self):
+        """
+        Flags the connection to the DB as lost, data points are spooled until it is restablished.
+        """
+        if dbConnection.isConnected():
+            output("Connection to database lost, spooling data points until it is restablished.", logger.error)
+        dbConnection.connectionLost()
+
+    def stop(self, timeout=None):
+        """
+        Inserts (or spools) all pending data points and stops the worker, waiting up to 'timeout' seconds.
+        """
+        self.__stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            try:
+                if self.__iterate():
+                    return
+            except Exception:
+                output("Unexpected error while inserting data points, retrying in " +
+                       str(self.error_retry_interval) + " seconds:", logger.error)
+                output(traceback.format_exc(), logger.error)
+                self.__error_retry_at = time.time() + self.error_retry_interval
+                if self.__stopping.is_set():
+                    self.__spoolPending()
+                    if self.__spool is not None:
+                        self.__spool.close()
+                    return
+
+    def __iterate(self):
+        # Queues one data point (if any arrives in time) and inserts or spools pending ones if due, returns
+        # True once stopped
+        try:
+            queued_at, data, db, collection, bucket = self.__queue.get(timeout=self.__timeout())
+            self.__batches.setdefault((db, collection, bucket), []).append(data)
+            self.__pending += 1
+            if self.__oldest is None:
+                self.__oldest = queued_at
+        except Queue.Empty:
+            pass
+        self.__limitPending()
+        due = self.__pending >= self.batch_size or \
+            (self.__oldest is not None and time.time() - self.__oldest >= self.max_latency)
+        if self.__stopping.is_set() and self.__queue.empty():
+            if not self.__canInsert():
+                self.__spoolPending()
+            else:
+                self.__flush()
+            if self.__spool is not None:
+                self.__spool.close()
+            return True
+        if not self.__canInsert():
+            if due and time.time() >= self.__spool_retry_at:
+                self.__spoolPending()
+        elif due or not dbConnection.isConnected():
+            self.__flush()
+        return False
+
+    def __canInsert(self):
+        # True if the connection may be used (or retried), and inserts are not held after an unexpected error
+        return dbConnection.retryDue() and time.time() >= self.__error_retry_at
+
+    def __timeout(self):
+        # Time to wait for new data points before checking if pending ones are due. While nothing can be
+        # inserted nor spooled, waits until the next attempt instead of polling
+        if self.__oldest is None:
+            return 1.0
+        deadline = self.__oldest + self.max_latency
+        if not self.__canInsert() and (self.__spool is None or time.time() < self.__spool_retry_at):
+            retry_at = max(dbConnection.retryAt(), self.__error_retry_at)
+            if self.__spool is not None:
+                retry_at = min(retry_at, self.__spool_retry_at)
+            deadline = max(deadline, retry_at)
+        return min(1.0, max(0.0, deadline - time.time()))
+
+    def __limitPending(self):
+        # Drops the oldest data points kept in memory beyond max_pending
+        dropped = 0
+        while self.__pending > self.max_pending:
+            key = next(iter(self.__batches))
+            self.__batches[key].pop(0)
+            if len(self.__batches[key]) == 0:
+                del self.__batches[key]
+            self.__pending -= 1
+            dropped += 1
+        if dropped > 0:
+            output("Dropped " + str(dropped) + " data points, too many kept in memory.", logger.error)
+
+    def __flush(self):
+        # Replays the spool, then bulk inserts pending data points, spools them if the connection is lost
+        global globalDBClient
+        connected = dbConnection.isConnected()
+        try:
+            if not connected:
+                if not dbConnection.ping():
+                    self.__spoolPending()
+                    return False
+                globalDBClient = dbConnection.client()  # Created by ping() if the script started offline
+            self.__replay()
+            for key in self.__batches.keys():
+                self.__insert(self.__batches[key], key)
+                self.__pending -= len(self.__batches.pop(key))
+        except pymongo.errors.AutoReconnect:
+            self.connectionLost()
+            self.__spoolPending()
+            return False
+        if not connected:
+            output("Connection to database restablished.", logger.info)
+        self.__oldest = None
+        return True
+
+    def __spoolPending(self):
+        # Moves pending data points to the spool, keeps them in memory if there's no spool
+        if self.__spool is None or self.__pending == 0:
+            return
+        records = []
+        for key in self.__batches:
+            for data in self.__batches[key]:
+                data.setdefault('_id', ObjectId())  # Fixed Id, so replaying twice can't duplicate data points
+                records.append({'db': key[0], 'collection': key[1], 'bucket': key[2], 'data': data})
+        try:
+            self.__spool.append(records)
+        except (IOError, OSError):
+            output("Error writing to spool, keeping data points in memory.", logger.error)
+            self.__spool_retry_at = time.time() + self.error_retry_interval
+            return
+        self.__batches.clear()
+        self.__pending = 0
+        self.__oldest = None
+
+    def __replay(self):
+        # Inserts spooled data points, oldest segment first, removing each segment once inserted
+        if self.__spool is None:
+            return
+        while True:
+            oldest = self.__spool.oldest()
+            if oldest is None:
+                return
+            segment, records = oldest
+            batches = collections.OrderedDict()
+            for i in records:
+                bucket = i.get('bucket')
+                if bucket is not None:
+                    bucket = tuple(bucket)
+                batches.setdefault((i['db'], i['collection'], bucket), []).append(i['data'])
+            for key in batches:
+                if key[2] is not None:
+                    self.__insert(batches[key], key)
+                    continue
+                try:
+                    globalDBClient[key[0]][key[1]].insert(batches[key], continue_on_error=True)
+                except pymongo.errors.DuplicateKeyError:
+                    pass  # Already inserted before the replay was interrupted
+                except pymongo.errors.OperationFailure:
+                    output("Error saving spooled data to DB", logger.error)
+            self.__spool.remove(segment)
+            output("Replayed " + str(len(records)) + " spooled data points.", logger.info)
+
+    def __insert(self, data, key):
+        # Inserts list of data points as documents, or on buckets, given a (db, collection, bucket) key
+        with timings.time('db_insert'):
+            if key[2] is None:
+                return insertData(data, key[0], key[1])
+            return insertBuckets(data, key[0], key[1], key[2][0], key[2][1])
+
+
 #########################################################################################
 #                                                                                       #
 # Note:                                                                                 #
 #    Although all DB operations have been abstracted using the methods above, if the    #
 #    connection is lost, a pyMongo error will be thrown and, currently, this is handled #
-#    in the main() routine (handler: 'except pymongo.errors.AutoReconnect').            #
-#    This exception handler must be changed in order to support non-pyMongo database    #
-#    clients.                                                                           #
+#    by ReadingWriter and in the main() routine (handler:                               #
+#    'except pymongo.errors.AutoReconnect'), which spool data points until the          #
+#    connection is restablished. These exception handlers must be changed in order to   #
+#    support non-pyMongo database clients.                                              #
 #                                                                                       #
 #########################################################################################
 
@@ -399,7 +852,9 @@ def checkUpdates(current_settings, Id, path):
     Checks settings on DB for updates, and updates file and running settings.
 
     Notes:
-        Settings are retrieved/uploaded to the 'admin' database on the 'boards' collection by default.
+        - Settings are retrieved/uploaded to the 'admin' database on the 'boards' collection by default.
+        - Only the revision and change date are retrieved to check for updates, the whole settings
+        dictionary is only retrieved if it has changed.
 
     Args:
         current_settings (dict): current settings dictionary
@@ -408,15 +863,54 @@ def checkUpdates(current_settings, Id, path):
 
     Returns:
         settings dictionary if new settings are found on DB
-        None if no new settings are found on DB (conpared to current settings by date)
+        None if no new settings are found on DB (conpared to current settings by revision, or date)
         False if it was not possible to retrieve settings from DB
 
     """
+    db_revision = getSettingsRevisionFromDB(Id)
+    if db_revision is not None and not isNewerSettings(current_settings, db_revision):
+        return None
     db_settings = getSettingsFromDB(Id)
     if db_settings is None:
         # Could not retrieve settings from db, deleted?
         output("Problem retrieving settings from DB. Board may have been deleted from server", logger.error)
         return False
+    if isNewerSettings(current_settings, db_settings):
+        output("\n\nNew settings found on DB, updating...", logger.info)
+        saveSettingsToFile(db_settings, path)
+        output("New settings updated.", logger.info)
+        return db_settings
+    return None
+
+
+def getSettingsRevision(settings):
+    """
+    Returns the settings revision number, or None if the settings have no revision (saved by older
+    versions of the web management interface).
+
+    Args:
+        settings (dict): Settings dictionary.
+    """
+    try:
+        return int(settings['revision']['value'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def isNewerSettings(current_settings, db_settings):
+    """
+    Returns True if 'db_settings' are newer than 'current_settings'.
+
+    Notes:
+        Settings are compared by revision number, or by change date if 'db_settings' has no revision.
+
+    Args:
+        current_settings (dict): current settings dictionary
+        db_settings (dict): settings dictionary (or revision projection) retrieved from DB
+    """
+    db_revision = getSettingsRevision(db_settings)
+    if db_revision is not None:
+        return (getSettingsRevision(current_settings) or 0) < db_revision
     try:
         curr_date = time.strptime(current_settings['changes']['date'], "%m/%d/%y %I:%M:%S%p")
     except:
@@ -425,12 +919,51 @@ def checkUpdates(current_settings, Id, path):
         db_date = time.strptime(db_settings['changes']['date'], "%m/%d/%y %I:%M:%S%p")
     except:
         db_date = 0
-    if curr_date < db_date:
-        output("\n\nNew settings found on DB, updating...", logger.info)
-        saveSettingsToFile(db_settings, path)
-        output("New settings updated.", logger.info)
-        return db_settings
-    return None
+    return curr_date < db_date
+
+
+def getSettingValue(settings, key, default=None):
+    """
+    Returns the value of 'key' in the settings block of the settings dictionary.
+
+    Notes:
+        Boards initialized before 'key' was introduced may not have it in their settings, in which
+        case, or if the value has been left blank, 'default' is returned.
+
+    Args:
+        settings (dict): Current settings dictionary.
+        key (str): Key in the settings block (e.g. 'sensor_reading_frequency').
+        default (any): Value returned if 'key' is not set.
+    """
+    try:
+        value = settings['settings']['value'][key]['value']
+    except (KeyError, TypeError):
+        return default
+    if value is None or str(value).strip() == "":
+        return default
+    return value
+
+
+def getSensorValue(sensor, key, default=None):
+    """
+    Returns the value of 'key' in a sensor configuration dictionary.
+
+    Notes:
+        Sensors configured before 'key' was introduced may not have it, in which case, or if the value has
+        been left blank, 'default' is returned.
+
+    Args:
+        sensor (dict): Sensor configuration dictionary, as in settings['sensors']['value'].
+        key (str): Key in the sensor configuration (e.g. 'wait_time').
+        default (any): Value returned if 'key' is not set.
+    """
+    try:
+        value = sensor[key]['value']
+    except (KeyError, TypeError):
+        return default
+    if value is None or str(value).strip() == "":
+        return default
+    return value
 
 
 def saveSettingsToFile(settings, path):
@@ -516,27 +1049,124 @@ def getSettingsFromDB(Id):
     return getConfigData(Id)
 
 
+def getSettingsRevisionFromDB(Id):
+    """
+    Gets only the settings revision and change date from DB given an Id.
+
+    Args:
+        Id (str or ObjectId): Board Id, corresponding to settings entry Id on database.
+
+    Returns:
+        Dictionary with the 'revision' and 'changes' keys (as available), if found.
+        None, if not found, if 'Id' is None, or error.
+    """
+    if Id is None:
+        return None
+    return getConfigData(Id, {'revision': 1, 'changes.date': 1})
+
+
 def uploadLog(log_path, Id):
     """
-    Uploads the current log to the database.
+    Uploads the lines appended to the current log since the last upload to the database.
 
     Notes:
-        Log is uploaded to the 'admin' database on the 'log' collection by default.
+        - Log is uploaded to the 'admin' database on the 'log' collection by default.
+        - The log entry is replaced on the first upload, or if the log file has been truncated, and
+        only the newest 'log_max_lines' lines are kept on the database.
+        - Incomplete lines are left for the next upload.
+        - Nothing is uploaded while the DB cannot be reached, lines are uploaded once it can.
 
     Args:
         log_path (str): Path to log file
         Id (str or ObjectId): Board Id, corresponding to settings/log entry Id on database
 
     """
-    # Uploads only current log
+    global log_offset
+    global log_upload_id
+    global log_upload_time
+    if dbConnection is None or not dbConnection.isConnected():
+        return
+    log_error_event.clear()
     try:
         with open(log_path) as log_file:
+            log_file.seek(0, os.SEEK_END)
+            if log_file.tell() < log_offset or log_upload_id != Id:
+                log_offset = 0  # Log truncated, or new log entry, upload everything
+            log_file.seek(log_offset)
             text = log_file.read()
-            if updateLogData(Id, text) is None:
-                output("Error uploading log, ignoring...", logger.error)
     except:
         output("Error opening log file, ignoring...", logger.error)
         raise
+    end = text.rfind('\n') + 1
+    lines = text[:end].splitlines()
+    if log_offset == 0:
+        result = updateLogData(Id, lines[-log_max_lines:])
+    elif len(lines) > 0:
+        result = appendLogData(Id, lines, log_max_lines)
+    else:
+        result = True
+    if result is None:
+        output("Error uploading log, ignoring...", logger.error)
+        return
+    log_offset += end
+    log_upload_id = Id
+    log_upload_time = time.time()
+
+
+def publishHeartbeat(Id):
+    """
+    Publishes the board's heartbeat, a small document with its liveness metrics, to the database.
+
+    Notes:
+        - Heartbeat is published to the 'admin' database on the 'heartbeat' collection by default, and is
+        used by the web_management fleet overview to spot slow or stalled boards.
+        - Counters are kept since the script was started.
+
+    Args:
+        Id (str or ObjectId): Board Id, corresponding to settings/log entry Id on database
+    """
+    global heartbeat_time
+    data = {
+        'date': now(),
+        'hostname': hostname,
+        'ip': ip_address,
+        'version': version,
+        'status': settings['status']['value'],
+        'db_name': settings['settings']['value']['db_name']['value'],
+        'collection_name': settings['settings']['value']['collection_name']['value'],
+        'reading_frequency': float(settings['settings']['value']['sensor_reading_frequency']['value']),
+        'heartbeat_interval': float(getSettingValue(settings, 'heartbeat_interval', 60)),
+        'uptime': time.time() - heartbeat_stats['start_time'],
+        'counter': counter,
+        'last_sample': heartbeat_stats['last_sample'],
+        'cycle_duration': heartbeat_stats['cycle_duration'],
+        'queue_depth': readingWriter.qsize(),
+        'spool_size': readingWriter.spoolSize(),
+        'sensor_errors': heartbeat_stats['sensor_errors'],
+        'logged_errors': heartbeat_stats['logged_errors'],
+        'db_state': dbConnection.state(),
+        'reconnects': dbConnection.reconnects,
+        'restarts': heartbeat_stats['restarts']
+    }
+    heartbeat_time = time.time()
+    if updateHeartbeatData(Id, data) is None:
+        output("Error publishing heartbeat, ignoring...", logger.error)
+
+
+def writeStats(path):
+    """
+    Writes the per-phase timings (count, min/max/mean, percentiles and histogram of the newest durations
+    of each phase, in seconds) to the local stats file at 'path'.
+
+    Args:
+        path (str): Path to stats file
+    """
+    global stats_time
+    stats_time = time.time()
+    try:
+        timings.dump(path)
+    except (IOError, OSError):
+        output("Error writing stats file, ignoring...", logger.error)
 
 
 #########################################################################################
@@ -547,43 +1177,87 @@ def uploadLog(log_path, Id):
 
 def matchSerialPorts(settings, path):
     """
-    Matches the available tty ports in the '/dev/' path to the paths in the settings file. If all
-    paths from the settings file cannot be matched, exit.
+    Matches the available tty ports in the '/dev/' path to the paths in the settings file, and returns the
+    indexes of the sensors whose ports could not be matched.
     If any of the paths is using the '/dev/ttyUSBx' format, find sysfs path, and save to DB/File.
 
     Notes:
         - Replaces '/dev/ttyUSBx' paths for sysfs paths, and saves to DB/File.
         - No need for 'Id' arg, since settings dictionary is provided.
+        - Sensors not matched are not instantiated, and are quarantined until their device is connected,
+        see instantiateSensors() and SensorSupervisor.
 
 
     Args:
         settings (dict): Settings dictionary to be used for matching. Paths can be of sysfs or '/dev/ttyUSBx' type.
         path (str): Path to config file.
+
+    Returns:
+        list: Indexes of the sensors (in settings['sensors']['value']) not connected.
     """
-    available_ports = listPorts()
+    index = getTTYIndex(refresh=True)
     update = False
-    if len(available_ports) == 0:
-        output("No ports found. Now exiting.", logger.error)
-        quit()
-    ports = []
-    syspaths = []
-    for i in available_ports:
-        ports.append(i[0])  # get only ttyUSBx values
-        syspaths.append(getSysPathFromTTY(i[0]))
-    for i in settings['sensors']['value']:
+    missing = []
+    for n, i in enumerate(settings['sensors']['value']):
         if i['path']['value'].strip().find('/dev/') == 0:  # If starts with /dev/ must be /dev/ttyUSBx
-            settings['sensors']['value'][settings['sensors']['value'].index(i)]['path']['value'] = getSysPathFromTTY(i['path']['value'])
-            update = True
-        if i['path']['value'] not in syspaths:
+            try:
+                i['path']['value'] = getSysPathFromTTY(i['path']['value'])
+                update = True
+            except SerialError:
+                missing.append(n)
+                continue
+        if i['path']['value'].strip().rstrip('/') not in index['tty']:
             # Check if path in the settings file doesn't exist in sysfs (syspaths)
-            output("Not all sensors are connected. Check connections and try again:", logger.error)
-            output("Sensor: " + i['path']['value'], logger.error)
-            raise SerialError("Could not find serial device.", i['name']['value'], i['path']['value'], 1, 'matchSerialPorts()')
+            missing.append(n)
+    for n in missing:
+        output("Sensor not connected: " + settings['sensors']['value'][n]['name']['value'] + ' @ ' +
+               settings['sensors']['value'][n]['path']['value'], logger.error)
     if update:
-        #  Add syspaths to config file, and push to server:
+        #  Add syspaths to config file, and push to server (if reachable):
         output("Updated syspaths", logger.info)
         saveSettingsToFile(settings, path)
-        saveSettingsToDB(settings, settings['_id'])
+        if dbConnection.isConnected():
+            saveSettingsToDB(settings, settings['_id'])
+    return missing
+
+
+def getTTYIndex(refresh=False):
+    """
+    Returns the index of serial devices, read directly from sysfs, as a dictionary:
+
+        {'sysfs': {'/dev/ttyUSB0': sysfs path, ...}, 'tty': {sysfs path: '/dev/ttyUSB0', ...}}
+
+    Where sysfs paths are those of the USB device, as stored in the settings file (e.g.
+    '/sys/devices/platform/.../1-1.2:1.0/'), keys of 'tty' having no trailing '/'.
+
+    Notes:
+        The index is cached, and only rebuilt when the modification time of sys_tty_path changes (tty
+        devices added or removed), when 'refresh' is True, or by the lookups below if a cached entry is
+        no longer valid.
+
+    Args:
+        refresh (bool): If True, rebuilds the index.
+    """
+    global tty_index
+    global tty_index_mtime
+    try:
+        mtime = os.stat(sys_tty_path).st_mtime
+    except OSError:
+        return {'sysfs': {}, 'tty': {}}
+    if tty_index is not None and mtime == tty_index_mtime and not refresh:
+        return tty_index
+    index = {'sysfs': {}, 'tty': {}}
+    for name in os.listdir(sys_tty_path):
+        if not os.path.exists(sys_tty_path + name + '/device'):
+            continue  # Not a serial device (e.g. virtual terminals)
+        real_path = os.path.realpath(sys_tty_path + name)
+        # Same as udevadm's path up to the tty folder, e.g. /sys/devices/.../1-1.2:1.0/ttyUSB0/tty/ttyUSB0
+        path = real_path[:real_path.find('tty')]
+        index['sysfs']['/dev/' + name] = path
+        index['tty'][path.rstrip('/')] = '/dev/' + name
+    tty_index = index
+    tty_index_mtime = mtime
+    return index
 
 
 def getTTYFromPath(path):
@@ -598,16 +1272,19 @@ def getTTYFromPath(path):
 
     Returns:
         str: returns a properly formatted '/dev/ttyUSBx' path
+
+    Exceptions:
+        Raises SerialError #1 if no serial device is found at 'path'.
     """
     path = path.strip()
     if path.find('/dev/') == 0:  # If starts with /dev/ must be /dev/ttyUSBx
         return path
-    arg = 'ls ' + path + ' |grep tty'  # Build arg string: ls /sys/path/... |grep tty
-    port = '/dev/' + subprocess.check_output(arg, shell=True)[0:-1]  # Remove \n, and prepend /dev/
-    if(port == '/dev/tty'):  # Ubuntu/Debian exception, handle 'tty' subfolder
-            arg = 'ls ' + path + '/tty |grep tty'
-            port = '/dev/' + subprocess.check_output(arg, shell=True)[0:-1]
-    return port.strip()
+    port = getTTYIndex()['tty'].get(path.rstrip('/'))
+    if port is None or not isValidTTY(port, path):
+        port = getTTYIndex(refresh=True)['tty'].get(path.rstrip('/'))
+    if port is None:
+        raise SerialError("Could not find serial device.", 'N/D', path, 1, 'getTTYFromPath()')
+    return port
 
 
 def getSysPathFromTTY(TTY):
@@ -619,15 +1296,25 @@ def getSysPathFromTTY(TTY):
 
     Returns:
         str: returns a properly formatted sysfs path
+
+    Exceptions:
+        Raises SerialError #1 if 'TTY' is not a serial device.
     """
     TTY = TTY.strip()
-    arg = 'udevadm info -q path -n ' + TTY  # String to be executed: udevadm info -q path -n /dev/ttyUSBx
-    res = subprocess.check_output(arg, shell=True)  # Returns sysfs path
-    path = '/sys' + res[0:res.index('tty')]  # prepend /sys and remove tty folder
-    return path.strip()
+    path = getTTYIndex()['sysfs'].get(TTY)
+    if path is None or not isValidTTY(TTY, path):
+        path = getTTYIndex(refresh=True)['sysfs'].get(TTY)
+    if path is None:
+        raise SerialError("Could not find serial device.", 'N/D', TTY, 1, 'getSysPathFromTTY()')
+    return path
+
 
+def isValidTTY(TTY, path):
+    # Checks that cached 'TTY' still belongs to the device at sysfs 'path', without rebuilding the index
+    return os.path.realpath(sys_tty_path + os.path.basename(TTY)).startswith(path.rstrip('/') + '/')
 
-def instantiateSensors(sensors_list):
+
+def instantiateSensors(sensors_list, skip_missing=False):
     """
     Creates and returns a list of properly initialized sensors given a list of standard sensor
     configuration data.
@@ -663,34 +1350,536 @@ def instantiateSensors(sensors_list):
                     "title": "Measurement Units (comma separated)",
                     "type": "string",
                     "value": ""
+                },
+                "read_mode": {
+                    "title": "Read Mode ('wait' for wait_time, or 'line' to read as soon as a line arrives)",
+                    "type": "string",
+                    "value": "wait"
+                },
+                "timing_profile": {
+                    "title": "Timing Profile ('legacy', 'adaptive' or 'fast')",
+                    "type": "string",
+                    "value": "legacy"
+                },
+                "stream_aggregation": {
+                    "title": "Streaming Aggregation (blank to send read_command, or 'latest', 'mean', 'min', 'max')",
+                    "type": "string",
+                    "value": ""
+                },
+                "status_command": {
+                    "title": "Status Command (blank for none, sent along with every reading)",
+                    "type": "string",
+                    "value": ""
+                },
+                "reading_frequency": {
+                    "title": "Reading Frequency (Seconds, blank for the board's Sensor Reading Frequency)",
+                    "type": "string",
+                    "value": ""
                 }
             }
 
+        If sensor_n['stream_aggregation']['value'] is set, the sensor is read continuously in the background, and
+        each reading returns the values received since the last one, aggregated.
+        If sensor_n['status_command']['value'] is set, it is sent right after read_command on every reading,
+        see queueStatusCommand().
+        If sensor_n['reading_frequency']['value'] is set, the sensor is read at its own frequency instead of
+        the board's sensor_reading_frequency, see main().
+
+        Sensors are instantiated concurrently, one thread per sensor, so opening all ports takes as long as
+        opening the slowest one. If any sensor fails, the ones already instantiated are released.
+
         Note that sensor_n['path']['value'] may be either a sysfs path or a /dev/ttyUSBx path, such as:
 
             sensor_n['path']['value'] = '/sys/devices/platform/...''
         or
             sensor_n['path']['value'] = '/dev/ttyUSB0'
 
+        skip_missing (bool): If True, sensors whose device is not connected are left as None, instead of
+        raising SerialError #1, so they can be quarantined (see SensorSupervisor).
+
     Returns:
-        list: List containing initialized sensors (instances of SerialSensor):
+        list: List containing initialized sensors (instances of SerialSensor), or None for the sensors
+        skipped:
+
+    Exceptions:
+        Raises the exception of the first sensor (in the order of 'sensors_list') that could not be
+        instantiated, e.g. SerialError.
     """
-    sensors = []
-    for i in sensors_list:  # Instantiate sensors defined in settings file
-        port = getTTYFromPath(i['path']['value'])
+    results = [None]*len(sensors_list)
+    exc_info = [None]*len(sensors_list)
+
+    def instantiate(index):
+        i = sensors_list[index]
         try:
+            try:
+                port = getTTYFromPath(i['path']['value'])
+            except SerialError, e:
+                if skip_missing and e.errno == 1:
+                    return
+                raise
+            if skip_missing and not os.path.exists(port):
+                return  # Unmatched '/dev/ttyUSBx' path
+            if str(getSensorValue(i, 'read_mode', 'wait')).strip().lower() == 'line':
+                read_mode = LINE_MODE
+            else:
+                read_mode = WAIT_MODE
             # initialize sensors:
-            sensors.append(SerialSensor(i['name']['value'],
-                                        i['units']['value'],
-                                        port,
-                                        i['wait_time']['value'],
-                                        i['baud_rate']['value'],
-                                        read_command=i['read_command']['value']
-                                        ))
+            sensor = SerialSensor(i['name']['value'],
+                                  i['units']['value'],
+                                  port,
+                                  i['wait_time']['value'],
+                                  i['baud_rate']['value'],
+                                  read_command=i['read_command']['value'],
+                                  read_mode=read_mode,
+                                  timing_profile=str(getSensorValue(i, 'timing_profile', 'legacy')).strip().lower()
+                                  )
+            results[index] = sensor
+            aggregation = str(getSensorValue(i, 'stream_aggregation', '')).strip().lower()
+            if aggregation != '':
+                sensor.startStreaming(aggregation)
+            status_command = str(getSensorValue(i, 'status_command', '')).strip()
+            if status_command != '' and aggregation == '':
+                queueStatusCommand(sensor, status_command)
+        except:
+            exc_info[index] = sys.exc_info()
+
+    # Instantiate sensors defined in settings file
+    threads = [threading.Thread(target=instantiate, args=(index,)) for index in range(len(sensors_list))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    for index in range(len(sensors_list)):
+        if exc_info[index] is not None:
+            releaseSensors([i for i in results if i is not None])
+            if isinstance(exc_info[index][1], SerialError):
+                output('Could not initialize sensor "' + sensors_list[index]['name']['value'] + '"', logger.error)
+            raise exc_info[index][0], exc_info[index][1], exc_info[index][2]
+    return results
+
+
+def queueStatusCommand(sensor, command):
+    """
+    Queues 'command' on 'sensor', so it is sent right after read_command on every reading, and logs the
+    reply (and its latency) whenever it changes.
+
+    Args:
+        sensor (SerialSensor): Sensor the command is sent to.
+        command (str): Status command (e.g. 'I', for the Air Board's version).
+    """
+    last_reply = [None]
+
+    def logStatus(command, reply, latency):
+        if reply != last_reply[0]:
+            output('Sensor "' + sensor.getName() + '" status ("' + command + '"): "' + str(reply) +
+                   '", replied in ' + str(round(latency, 1)) + 'ms', logger.info)
+            last_reply[0] = reply
+        sensor.queueCommand(command, logStatus)
+
+    sensor.queueCommand(command, logStatus)
+
+
+class SensorSupervisor:
+    """
+    Keeps sensors that could not be recovered (see recoverSensor()) out of the readings, while the other
+    sensors keep being read, and reattaches them without reloading the other sensors or rebooting the board.
+
+    Notes:
+        - Quarantined sensors are disabled and closed. Their sysfs path is polled by poll(), and the sensor
+        is instantiated again as soon as its device reappears, e.g. after a USB adapter is reconnected.
+        - Sensors whose device never disappeared are instantiated again every 'retry_interval' seconds.
+
+    Args:
+        sensors_list (list): Sensor configuration data, as in settings['sensors']['value'], in the same order
+        as the sensors.
+        retry_interval (float): Time (in seconds) between attempts to reattach a sensor whose device is present.
+    """
+    def __init__(self, sensors_list, retry_interval=60.0):
+        self.retry_interval = retry_interval
+        self.__sensors_list = sensors_list
+        self.__quarantined = {}  # {index: {'present': bool, 'retry_at': float}, ...}
+
+    def quarantine(self, sensors, index, state=None):
+        """
+        Disables and closes sensors[index], and starts watching for its device. sensors[index] may be None,
+        for sensors not instantiated because their device is not connected (see instantiateSensors()).
+
+        Args:
+            state (dict): Quarantine state of a sensor already quarantined by another supervisor, kept as is,
+            see reconfigured().
+        """
+        if state is not None:
+            self.__quarantined[index] = dict(state)
+            return
+        if sensors[index] is not None:
+            sensors[index].enable(False)
+            try:
+                sensors[index].stopStreaming()
+                sensors[index].close()
+            except:
+                pass
+        self.__quarantined[index] = {'present': self.__isPresent(index),
+                                     'retry_at': time.time() + self.retry_interval}
+        output("Quarantined sensor " + self.__sensors_list[index]['name']['value'] + ' @ ' + self.__path(index) +
+               ", other sensors will keep being read.", logger.error)
+
+    def quarantined(self):
+        """
+        Returns the sorted list of indexes of quarantined sensors.
+        """
+        return sorted(self.__quarantined)
+
+    def reconfigured(self, sensors, sensors_list, reused, retry_interval):
+        """
+        Returns the supervisor for the sensors of new settings, keeping the quarantined sensors that were
+        carried over (see reconfigureSensors()) quarantined, and quarantining the sensors not connected.
+
+        Args:
+            sensors (list): New sensors, None for sensors not connected.
+            sensors_list (list): New sensor configuration data.
+            reused (dict): {new index: current index} of the sensors carried over.
+            retry_interval (float): See SensorSupervisor.
+        """
+        supervisor = SensorSupervisor(sensors_list, retry_interval)
+        for i in range(len(sensors)):
+            if reused.get(i) in self.__quarantined:
+                supervisor.quarantine(sensors, i, self.__quarantined[reused[i]])
+            elif sensors[i] is None:
+                supervisor.quarantine(sensors, i)
+        return supervisor
+
+    def poll(self, sensors):
+        """
+        Checks the devices of quarantined sensors, and replaces sensors[index] by a newly instantiated sensor
+        once its device reappears (or, if it never disappeared, once the retry interval has elapsed).
+
+        Returns:
+            list: Indexes of the sensors reattached.
+        """
+        reattached = []
+        for index in self.quarantined():
+            state = self.__quarantined[index]
+            if not self.__isPresent(index):
+                state['present'] = False
+                continue
+            if state['present'] and time.time() < state['retry_at']:
+                continue
+            try:
+                sensor = instantiateSensors([self.__sensors_list[index]])[0]
+            except SerialError, e:
+                output("Could not reattach sensor @ " + self.__path(index) + ": " + str(e), logger.error)
+                state['present'] = True
+                state['retry_at'] = time.time() + self.retry_interval
+                continue
+            sensors[index] = sensor
+            del self.__quarantined[index]
+            reattached.append(index)
+            output("Reattached sensor " + sensor.getName() + ' @ ' + sensor.getPort(), logger.info)
+        return reattached
+
+    def __path(self, index):
+        return self.__sensors_list[index]['path']['value']
+
+    def __isPresent(self, index):
+        try:
+            getTTYFromPath(self.__path(index))
+        except SerialError:
+            return False
+        return True
+
+
+def releaseSensors(sensors):
+    """
+    Stops streaming sensors and closes all serial ports, so sensors can be instantiated again.
+
+    Args:
+        sensors (list): List containing initialized sensors (instances of SerialSensor).
+    """
+    for i in sensors:
+        if i is None:
+            continue
+        try:
+            i.stopStreaming()
+            i.close()
+        except:
+            pass
+
+
+def readSensors(sensors):
+    """
+    Reads all enabled sensors concurrently and merges their readings into a single JSON dictionary.
+
+    Notes:
+        - Sensors on different ports are read in parallel, so a reading takes as long as the slowest
+        sensor, instead of the sum of all waiting times.
+        - The time spent on each phase of each sensor's reading is recorded on 'timings', as
+        'sensor.<name>.<phase>' (see SerialSensor.getTimings()).
+        - Sensors sharing the same port are read sequentially by the same thread, in the order they are
+        given. If one of them fails, the remaining sensors on that port are not read.
+        - Exceptions other than SerialError are re-raised on the calling thread.
+
+    Args:
+        sensors (list): List containing initialized sensors (instances of SerialSensor), None entries
+        (sensors not instantiated) are ignored.
+
+    Returns:
+        tuple: (readings, errors), where readings is the merged JSON dictionary of all sensors read, and
+        errors is a list of (SerialSensor, SerialError) tuples, in the same order as 'sensors'.
+    """
+    ports = collections.OrderedDict()
+    for i in sensors:
+        if i is not None and i.isEnabled():
+            ports.setdefault(i.getPort(), []).append(i)
+    results = {}
+    exc_info = []
+
+    def readPort(port_sensors):
+        for i in port_sensors:
+            try:
+                results[i] = i.read()
+                for phase, duration in i.getTimings().iteritems():
+                    timings.add('sensor.' + i.getName() + '.' + phase, duration)
+            except SerialError, e:
+                results[i] = e
+                return
+            except:
+                exc_info.append(sys.exc_info())
+                return
+
+    threads = [threading.Thread(target=readPort, args=(port_sensors,)) for port_sensors in ports.itervalues()]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    if exc_info:
+        raise exc_info[0][0], exc_info[0][1], exc_info[0][2]
+    readings = {}
+    errors = []
+    for i in sensors:
+        if i not in results:
+            continue
+        if isinstance(results[i], SerialError):
+            errors.append((i, results[i]))
+        else:
+            readings.update(results[i])
+    return readings, errors
+
+
+def recoverSensor(i, e, period=None):
+    """
+    Tries to recover a sensor that raised a SerialError, by reopening its port and reading it again.
+
+    Notes:
+        - Tries 3 times, then once more with a longer wait, before giving up.
+        - Streaming sensors (see SerialSensor.startStreaming()) are only reopened, since the background reader
+        owns the port, and are given up to 'period' seconds (at most STREAM_RECOVERY_TIMEOUT) to stream a
+        line before each read, twice, before giving up.
+        - If the error cannot be recovered the sensor must be quarantined (see SensorSupervisor), or
+        execution stops, depending on the error number.
+
+    Args:
+        i (SerialSensor): Sensor that raised the exception.
+        e (SerialError): Exception raised by the sensor.
+        period (float): Time between readings of the sensor, in seconds.
+
+    Returns:
+        True if the sensor could be recovered, or if execution may continue.
+        False if the sensor could not be recovered, and must be quarantined.
+    """
+    output("\n\n", logger.error)
+    output(e, logger.error)
+    output("The previous error was due to the following exception:", logger.error)
+    output(e.SourceTraceback(), logger.error)
+    if i.isStreaming():
+        timeout = STREAM_RECOVERY_TIMEOUT if not period else min(max(float(period), 1.0), STREAM_RECOVERY_TIMEOUT)
+        for j in xrange(2):
+            try:
+                i.close()
+                i.open()
+                i.waitForStream(timeout)
+                i.read()
+                return True
+            except SerialError, e:
+                output("SerialError Exception occured during #" + str(j) + " trial. Error:", logger.error)
+                output(e, logger.error)
+        output("Exhausted maximum number of trials.", logger.error)
+        output("\nQuarantining sensor, due to fault in: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
+        return False
+    for j in xrange(3):
+        try:
+            i.close()
+            i.open()
+            i.send('\r\n')
+            time.sleep(0.6)
+            i.readRaw()
+            i.read()
+            break
         except SerialError, e:
-            output('Could not initialize sensor "' + i['name']['value'] + '"', logger.error)
-            raise
-    return sensors
+            output("SerialError Exception occured during #" + str(j) + " trial. Error:", logger.error)
+            output(e, logger.error)
+            output(e.SourceTraceback(), logger.error)
+            time.sleep(1.5)
+        except:
+            output("Unknown Exception occured during #" + str(j) + " trial. Error:", logger.error)
+            output(traceback.format_exc(), logger.error)
+            time.sleep(1.5)
+    if j >= 2:  # If exhausted trials
+        try:
+            i.close()
+            i.open()
+            i.send('\r\n')
+            time.sleep(1.5)
+            i.readRaw()
+            i.read()
+        except SerialError, e:
+            output("Exhausted maximum number of trials. Error:", logger.error)
+            output(e, logger.error)
+            output(e.SourceTraceback(), logger.error)
+            if e.errno == 5 or e.errno == 3 or e.errno == 0 or e.errno == 2:
+                output("\nQuarantining sensor, due to fault in: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
+                return False
+            else:
+                output("\nFault in: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
+                output("Error cannot be fixed by reloading or rebooting. Check Board!", logger.error)
+                quit()
+        except:
+            output("\n\nRebooting board due to non SerialError fault in: " + e.sensor + ' @ ' + e.port + ', Errno ' + str(e.errno), logger.error)
+            output(traceback.format_exc(), logger.error)
+            uploadLog(log_path, settings['_id'])
+            os.system("systemctl reboot")
+            sys.exit(0)
+    return True
+
+
+def reconfigure(settings, new_settings, sensors, supervisor):
+    """
+    Applies new settings to the running script without initialize(), changing only what differs from the
+    current settings: sensors whose configuration is unchanged keep their open ports, and the DB client is
+    kept.
+
+    Notes:
+        - A reload (initialize()) is still required if the server, username, password or hostname changed.
+        - Settings read from 'settings' on every use (e.g. db_name, collection_name) need no action, the
+        writer and scheduler are set up again by the caller (see configureWriter() and buildScheduler()).
+
+    Args:
+        settings (dict): Current settings dictionary.
+        new_settings (dict): New settings dictionary, as returned by checkUpdates().
+        sensors (list): Current sensors (instances of SerialSensor), in the same order as settings['sensors'].
+        supervisor (SensorSupervisor): Current supervisor, its quarantined sensors are carried over still
+        quarantined if their configuration is unchanged.
+
+    Returns:
+        tuple: (sensors, supervisor) for new_settings['sensors'], or None if a reload is required. Sensors
+        not connected are quarantined.
+
+    Exceptions:
+        Raises the exceptions of instantiateSensors(), in which case the caller must reload.
+    """
+    for key in ('server', 'username', 'password', 'hostname'):
+        if getSettingValue(settings, key) != getSettingValue(new_settings, key):
+            output("Setting '" + key + "' changed, reloading...", logger.info)
+            return None
+    new_settings['version']['value'] = version
+    new_settings['ip']['value'] = ip_address
+    new_settings['status']['value'] = "Running"
+    if getSensorConfigs(settings['sensors']['value']) != getSensorConfigs(new_settings['sensors']['value']):
+        matchSerialPorts(new_settings, config_path)
+    sensors, reused = reconfigureSensors(sensors, settings['sensors']['value'], new_settings['sensors']['value'])
+    supervisor = supervisor.reconfigured(sensors, new_settings['sensors']['value'], reused,
+                                         float(getSettingValue(new_settings, 'quarantine_retry_interval', 60)))
+    saveSettingsToDB(new_settings, new_settings['_id'])
+    return sensors, supervisor
+
+
+def reconfigureSensors(sensors, sensors_list, new_sensors_list):
+    """
+    Returns the sensors for 'new_sensors_list', reusing the sensors in 'sensors' whose configuration is
+    unchanged, releasing the ones no longer used, and instantiating the new or changed ones.
+
+    Notes:
+        Quarantined sensors are reused too, the caller keeps them quarantined (see
+        SensorSupervisor.reconfigured()). New or changed sensors not connected are left as None.
+
+    Args:
+        sensors (list): Current sensors, in the same order as 'sensors_list'.
+        sensors_list (list): Current sensor configuration data.
+        new_sensors_list (list): New sensor configuration data.
+
+    Returns:
+        tuple: (sensors, reused), the sensors for 'new_sensors_list', and a dictionary {new index: current
+        index} of the sensors reused.
+
+    Exceptions:
+        Raises the exceptions of instantiateSensors(), which releases the sensors it instantiated.
+    """
+    configs = getSensorConfigs(sensors_list)
+    new_configs = getSensorConfigs(new_sensors_list)
+    reused = {}  # {new index: current index}
+    for i in range(len(new_configs)):
+        for j in range(len(configs)):
+            if j not in reused.values() and configs[j] == new_configs[i]:
+                reused[i] = j
+                break
+    # Release unused sensors first, so changed sensors can open the same port
+    releaseSensors([sensors[j] for j in range(len(sensors)) if j not in reused.values()])
+    changed = [i for i in range(len(new_configs)) if i not in reused]
+    instantiated = dict(zip(changed, instantiateSensors([new_sensors_list[i] for i in changed], skip_missing=True)))
+    new_sensors = []
+    for i in range(len(new_configs)):
+        if i in reused:
+            new_sensors.append(sensors[reused[i]])
+        else:
+            new_sensors.append(instantiated[i])
+            if instantiated[i] is not None:
+                output("Reconfigured sensor " + instantiated[i].getName() + ' @ ' + instantiated[i].getPort(), logger.info)
+    return new_sensors, reused
+
+
+def getSensorConfigs(sensors_list):
+    # Returns the values of each sensor configuration dictionary, without titles and types, for comparison
+    return [dict((key, i[key]['value']) for key in i) for i in sensors_list]
+
+
+def configureWriter(settings):
+    """
+    Applies the insert settings to readingWriter, and creates the bucket index if readings are stored on
+    buckets.
+    """
+    readingWriter.batch_size = int(getSettingValue(settings, 'insert_batch_size', 10))
+    readingWriter.max_latency = float(getSettingValue(settings, 'insert_max_latency', 30))
+    if str(getSettingValue(settings, 'storage_mode', 'document')).strip().lower() == 'bucket':
+        if not dbConnection.isConnected():
+            output("Database unreachable, bucket index not created.", logger.error)
+            return
+        try:
+            globalDBClient[settings['settings']['value']['db_name']['value']][
+                settings['settings']['value']['collection_name']['value']].create_index([('board', 1), ('start', 1)])
+        except pymongo.errors.OperationFailure:
+            output("Could not create bucket index.", logger.error)
+
+
+def buildScheduler(settings):
+    """
+    Returns a tuple (scheduler, periods, policy) with the MultiRateScheduler for the sensors in 'settings',
+    the reading frequency of each sensor and the missed tick policy.
+
+    Notes:
+        Each sensor is read on ticks aligned to multiples of its reading frequency, sensors due on the same
+        tick are read together and stored on the same document. Exits if there are no sensors.
+    """
+    policy = str(getSettingValue(settings, 'missed_tick_policy', SKIP)).strip().lower()
+    if policy not in MISSED_TICK_POLICIES:
+        output("Unknown missed tick policy '" + policy + "', using '" + SKIP + "'.", logger.error)
+        policy = SKIP
+    frequency = float(settings['settings']['value']['sensor_reading_frequency']['value'])
+    periods = [float(getSensorValue(i, 'reading_frequency', frequency)) for i in settings['sensors']['value']]
+    if len(periods) == 0:
+        output("No sensors set, exiting.", logger.error)
+        quit()
+    return MultiRateScheduler(periods, policy), periods, policy
 
 
 #########################################################################################
@@ -700,7 +1889,94 @@ def instantiateSensors(sensors_list):
 #########################################################################################
 
 
-def initialize(path, hostname, version):
+class StartupReport(Timings):
+    """
+    Durations of the startup steps, recorded with time() (see Timings) and logged as a report with log().
+
+    Notes:
+        Durations are also recorded on 'timings', as 'startup.<step>', so they show up on the stats file.
+    """
+    def __init__(self):
+        Timings.__init__(self)
+        self.__steps = []
+        self.__start_time = time.time()
+
+    def add(self, phase, duration):
+        """
+        Records 'duration' (in seconds) for startup step 'phase'.
+        """
+        Timings.add(self, phase, duration)
+        timings.add('startup.' + phase, duration)
+        self.__steps.append((phase, duration))
+
+    def log(self):
+        """
+        Logs the duration of each step, in the order they finished, and the time since the report was created.
+        """
+        report = "Startup steps (seconds):"
+        for step, duration in self.__steps:
+            report += '\n    ' + step.ljust(24) + '%.3f' % duration
+        report += '\n    ' + 'total'.ljust(24) + '%.3f' % (time.time() - self.__start_time)
+        output(report, logger.info)
+
+
+class SensorPrefetcher(threading.Thread):
+    """
+    Instantiates the sensors in the config file in the background, so serial ports are opened (and their
+    receive buffers settle) while initialize() connects to the DB and fetches the settings.
+
+    Notes:
+        - Sensors are only prefetched if all their paths are sysfs paths of connected devices, otherwise
+        nothing is done and the sensors are instantiated once ports are matched, as before.
+        - Errors are not raised, the sensors are then instantiated again after ports are matched.
+
+    Args:
+        path (str): Path to config file.
+        report (StartupReport): Records the time taken, as 'prefetch_sensors'.
+    """
+    def __init__(self, path, report):
+        threading.Thread.__init__(self, name="SensorPrefetcher")
+        self.daemon = True
+        self.__path = path
+        self.__report = report
+        self.__sensors_list = None
+        self.__sensors = None
+
+    def run(self):
+        with self.__report.time('prefetch_sensors'):
+            try:
+                with open(self.__path) as config_file:
+                    sensors_list = json_util.loads(config_file.read())['sensors']['value']
+                index = getTTYIndex(refresh=True)
+                for i in sensors_list:
+                    path = i['path']['value'].strip()
+                    if path.find('/dev/') == 0 or path.rstrip('/') not in index['tty']:
+                        return
+                self.__sensors = instantiateSensors(sensors_list)
+                self.__sensors_list = sensors_list
+            except:
+                pass
+
+    def take(self, sensors_list):
+        """
+        Waits for the prefetch to finish and returns the sensors for 'sensors_list', reusing the prefetched
+        sensors whose configuration is unchanged, see reconfigureSensors().
+
+        Returns:
+            list: Sensors for 'sensors_list', or None if no sensors were prefetched.
+
+        Exceptions:
+            Raises the exceptions of instantiateSensors().
+        """
+        self.join()
+        if self.__sensors is None:
+            return None
+        sensors = self.__sensors
+        self.__sensors = None
+        return reconfigureSensors(sensors, self.__sensors_list, sensors_list)[0]
+
+
+def initialize(path, hostname, version, report=None):
     """
     Initialization routine.
     Initializes DB Client, and retrieves settings from DB and File for comparison.
@@ -711,32 +1987,53 @@ def initialize(path, hostname, version):
         - File config is essentially used to push settings/sensor settings pattern to DB, and insert
         already initialized settings to a new DB.
         - Exits script if cannot retrieve settings from DB after just inserting them.
+        - If the board has already been initialized and the DB cannot be reached within the
+        'offline_start_timeout' setting, file settings are used and readings are spooled until it can be
+        reached (see ReadingWriter). Otherwise waits up to 5 hours for the DB server.
 
     Args:
         path (str): Path to config file.
         hostname (str): Board's hostname.
         version (str): Board's version string (defined in the beginning)
+        report (StartupReport): If provided, records the time taken to reach and connect to the DB, as
+        'reachability' and 'db_connect'.
 
     Returns:
         settings dictionary.
     """
     global globalDBClient
 
+    if report is None:
+        report = StartupReport()
     file_settings = getSettingsFromFile(path)  # Get username, password and server
-    for j in xrange(3*60*60/15):  # 720 trials
-        try:
+    offline = file_settings['changes']['date'] != "" and '_id' in file_settings  # May start offline
+    if offline:
+        wait = float(getSettingValue(file_settings, 'offline_start_timeout', 120))
+    else:
+        wait = 60*60*5
+    with report.time('reachability'):
+        reachable = waitForServer(file_settings, wait)
+    with report.time('db_connect'):
+        if offline:
+            globalDBClient = DBConnect(file_settings['settings']['value']['server']['value'],
+                                       username=file_settings['settings']['value']['username']['value'],
+                                       password=file_settings['settings']['value']['password']['value'],
+                                       timeout=wait if reachable else 0,
+                                       required=False
+                                       )
+        else:
             globalDBClient = DBConnect(file_settings['settings']['value']['server']['value'],
                                        username=file_settings['settings']['value']['username']['value'],
                                        password=file_settings['settings']['value']['password']['value']
                                        )
-            break
-        except:
-            if j >= 3*60*60/15 - 1:
-                output("Could not connect to DB.", logger.error)
-                sys.exit(0)  # Don't bother with quit(), no connection anyway
-            else:
-                output("Trying again in 15 seconds.", logger.error)
-            time.sleep(15)
+    if globalDBClient is None:
+        output("Database unreachable, starting offline with settings from file. Readings are spooled until "
+               "it can be reached.", logger.error)
+        file_settings['version']['value'] = version
+        file_settings['ip']['value'] = ip_address
+        file_settings['status']['value'] = "Running"
+        saveSettingsToFile(file_settings, path)
+        return file_settings
 
     try:
         Id = file_settings['_id']
@@ -809,9 +2106,26 @@ def initialize(path, hostname, version):
 def main():
     global counter
     global settings
+    global settings_check_time
+    global readingWriter
+
+    # Open the serial ports in the background while connecting to the DB:
+    report = StartupReport()
+    prefetcher = SensorPrefetcher(config_path, report)
+    prefetcher.start()
 
     # initialization routine, and get new settings and DB client
-    settings = initialize(config_path, hostname, version)
+    with report.time('initialize'):
+        settings = initialize(config_path, hostname, version, report)
+
+    # Start write-behind queue, or reuse it if already running:
+    if readingWriter is None:
+        spool = Spool(spool_path, max_size=int(getSettingValue(settings, 'spool_max_size', 50))*1024*1024)
+        readingWriter = ReadingWriter(spool=spool)
+        readingWriter.start()
+    else:
+        heartbeat_stats['restarts'] += 1  # Reloaded after settings changed or a sensor was lost
+    configureWriter(settings)
 
     try:
         # log settings
@@ -827,26 +2141,25 @@ def main():
                    '\nServer:                   ' + settings['settings']['value']['server']['value'] + \
                    '\nDB name:                  ' + settings['settings']['value']['db_name']['value'] + \
                    '\nCollection name:          ' + settings['settings']['value']['collection_name']['value'] + \
-                   '\nFrequency (seconds):      ' + settings['settings']['value']['sensor_reading_frequency']['value'] + '\n'
+                   '\nFrequency (seconds):      ' + settings['settings']['value']['sensor_reading_frequency']['value'] + \
+                   '\nInsert batch size:        ' + str(readingWriter.batch_size) + \
+                   '\nInsert max latency (s):   ' + str(readingWriter.max_latency) + '\n'
         output(printout, logger.info)
         del printout
 
-        time.sleep(10)
-        try:
+        with report.time('match_ports'):
             # Find and match serial ports:
-            matchSerialPorts(settings, config_path)
-        except:
-            time.sleep(20)
-            # If cannot match again, quit.
-            try:
+            if len(matchSerialPorts(settings, config_path)) > 0:
+                time.sleep(20)
+                # If cannot match again, sensors not connected are quarantined.
                 matchSerialPorts(settings, config_path)
-            except:
-                output("Exiting...", logger.error)
-                quit()
 
         try:
-            # If all sensors from settings found, continue:
-            sensors = instantiateSensors(settings['sensors']['value'])
+            # Reuse the sensors opened in the background, sensors not connected are left as None:
+            with report.time('instantiate_sensors'):
+                sensors = prefetcher.take(settings['sensors']['value'])
+                if sensors is None:
+                    sensors = instantiateSensors(settings['sensors']['value'], skip_missing=True)
         except:
             output("Rebooting board due to exception while instantiating sensors...", logger.error)
             output(traceback.format_exc(), logger.error)
@@ -857,135 +2170,116 @@ def main():
         # Display initialized sensors
         output("Available sensors:", logger.info)
         for i in sensors:
+            if i is None:
+                continue
             output(i.getName() + ' @ ' + i.getPort() + " , Units: " +
                    i.getUnits() + " , Waiting time: " + str(i.getWaitTime()) + 'ms', logger.info)
 
-        output("Data points to date: " +
-               str(getDBCount(settings['settings']['value']['db_name']['value'],
-                              settings['settings']['value']['collection_name']['value'])),
-               logger.info
-               )
+        if dbConnection.isConnected():
+            with report.time('db_count'):
+                output("Data points to date: " +
+                       str(getDBCount(settings['settings']['value']['db_name']['value'],
+                                      settings['settings']['value']['collection_name']['value'])),
+                       logger.info
+                       )
 
+        report.log()
         output("Reading Started...", logger.info)
     finally:
         uploadLog(log_path, settings['_id'])
 
     # End of initialization
+    scheduler, periods, policy = buildScheduler(settings)
+    supervisor = SensorSupervisor(settings['sensors']['value'],
+                                  float(getSettingValue(settings, 'quarantine_retry_interval', 60)))
+    for i in range(len(sensors)):
+        if sensors[i] is None:  # Not connected
+            supervisor.quarantine(sensors, i)
+    missed = 0
     # Start reading:
     # Main Loop
 
     while True:
 
-        new_settings = checkUpdates(settings, settings['_id'], config_path)
-
-        uploadLog(log_path, settings['_id'])
+        new_settings = None
+        if readingWriter.isConnected():
+            try:
+                if time.time() - settings_check_time >= float(getSettingValue(settings, 'settings_check_interval', 30)):
+                    with timings.time('settings_check'):
+                        new_settings = checkUpdates(settings, settings['_id'], config_path)
+                    settings_check_time = time.time()
+                if log_error_event.is_set() or \
+                        time.time() - log_upload_time >= float(getSettingValue(settings, 'log_upload_interval', 60)):
+                    with timings.time('log_upload'):
+                        uploadLog(log_path, settings['_id'])
+                if time.time() - heartbeat_time >= float(getSettingValue(settings, 'heartbeat_interval', 60)):
+                    with timings.time('heartbeat'):
+                        publishHeartbeat(settings['_id'])
+            except pymongo.errors.AutoReconnect:
+                readingWriter.connectionLost()
 
         if new_settings is not None:
             if new_settings is False:
                 # Settings has been deleted from server
                 quit()
-            return
+            start_time = time.time()
+            try:
+                reconfigured = reconfigure(settings, new_settings, sensors, supervisor)
+            except Exception:
+                output("Could not apply new settings without reloading:", logger.error)
+                output(traceback.format_exc(), logger.error)
+                reconfigured = None
+            if reconfigured is None:
+                releaseSensors(sensors)
+                return
+            sensors, supervisor = reconfigured
+            settings = new_settings
+            configureWriter(settings)
+            scheduler, periods, policy = buildScheduler(settings)
+            missed = 0
+            output("New settings applied in " + str(int((time.time() - start_time)*1000)) + "ms.", logger.info)
 
         try:
+            tick, due = scheduler.wait()
+            if scheduler.missed() > missed:
+                output("Missed " + str(scheduler.missed() - missed) + " readings, policy: " + policy + ".", logger.info)
+                missed = scheduler.missed()
+            supervisor.poll(sensors)
             initial_time = time.time()
-            JSON_readings = {}  # clear dictionary for nex reading
-            for i in sensors:
-                if i.isEnabled():
-                    reading = i.read()
-                    JSON_readings.update(reading)
-            if JSON_readings == {} and counter > 2:
+            with timings.time('read_sensors'):
+                JSON_readings, errors = readSensors([sensors[i] for i in due])
+            if errors:
+                heartbeat_stats['sensor_errors'] += len(errors)
+                for i, e in errors:
+                    if not recoverSensor(i, e, periods[sensors.index(i)]):
+                        supervisor.quarantine(sensors, sensors.index(i))
+            if JSON_readings == {} and counter > 2 and len(supervisor.quarantined()) == 0:
                 # If all sensors are disabled
                 output("No data being sent, exiting.", logger.error)
                 quit()
+            if JSON_readings == {} and (errors or len(supervisor.quarantined()) > 0):
+                continue  # Sensors due failed or are quarantined, nothing to store
             counter += 1
-            JSON_readings['date'] = now()
-            insertReading(JSON_readings, settings)
+            # Readings taken late (e.g. missed ticks caught up) are stored with the time they were taken
+            JSON_readings['date'] = initial_time if scheduler.isLate(tick, initial_time) else tick
+            with timings.time('queue_reading'):
+                insertReading(JSON_readings, settings)
             print counter
             print JSON_readings
             print '\n'
             final_time = time.time()
-            sleep = (float(settings['settings']['value']['sensor_reading_frequency']['value']) - (final_time - initial_time))
-            if sleep >= 0.0:
-                time.sleep(sleep)
-            else:
+            heartbeat_stats['last_sample'] = JSON_readings['date']
+            heartbeat_stats['cycle_duration'] = final_time - initial_time
+            timings.add('cycle', final_time - initial_time)
+            if time.time() - stats_time >= float(getSettingValue(settings, 'stats_interval', 60)):
+                writeStats(stats_path)
+            if final_time - initial_time > min(periods[i] for i in due):
                 output("Running at " + str(final_time - initial_time) + " seconds per reading, \
                       more than defined reading frequency. Make necessary adjustments.", logger.info)
 
-        except SerialError, e:
-            output("\n\n", logger.error)
-            output(e, logger.error)
-            output("The previous error was due to the following exception:", logger.error)
-            output(e.SourceTraceback(), logger.error)
-            for j in xrange(3):
-                try:
-                    i.close()
-                    i.open()
-                    i.send('\r\n')
-                    time.sleep(0.6)
-                    i.readRaw()
-                    i.read()
-                    break
-                except SerialError, e:
-                    output("SerialError Exception occured during #" + str(j) + " trial. Error:", logger.error)
-                    output(e, logger.error)
-                    output(e.SourceTraceback(), logger.error)
-                    time.sleep(1.5)
-                except:
-                    output("Unknown Exception occured during #" + str(j) + " trial. Error:", logger.error)
-                    output(traceback.format_exc(), logger.error)
-                    time.sleep(1.5)
-            if j >= 2:  # If exhausted trials
-                try:
-                    i.close()
-                    i.open()
-                    i.send('\r\n')
-                    time.sleep(1.5)
-                    i.readRaw()
-                    i.read()
-                except SerialError, e:
-                    output("Exhausted maximum number of trials. Error:", logger.error)
-                    output(e, logger.error)
-                    output(e.SourceTraceback(), logger.error)
-                    if e.errno == 5 or e.errno == 3 or e.errno == 0 or e.errno == 2:
-                        try:
-                            ports_still_same = i.getPort() == getTTYFromPath(getSysPathFromTTY(i.getPort()))
-                        except:
-                            ports_still_same = False
-                        if not ports_still_same:
-                            output("\nReloading sensors due to exception. Ports have changed: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
-                            uploadLog(log_path, settings['_id'])
-                            return
-                        else:
-                            output("\nRebooting board, due to fault in: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
-                            uploadLog(log_path, settings['_id'])
-                            os.system("systemctl reboot")
-                            sys.exit(0)
-                    else:
-                        output("\nFault in: " + e.sensor + ' @ ' + e.port + ' errno ' + str(e.errno), logger.error)
-                        output("Error cannot be fixed by reloading or rebooting. Check Board!", logger.error)
-                        quit()
-                except:
-                    output("\n\nRebooting board due to non SerialError fault in: " + e.sensor + ' @ ' + e.port + ', Errno ' + str(e.errno), logger.error)
-                    output(traceback.format_exc(), logger.error)
-                    uploadLog(log_path, settings['_id'])
-                    os.system("systemctl reboot")
-                    sys.exit(0)
-
         except pymongo.errors.AutoReconnect, e:
-            output("\n\nConnection to database Lost, trying to reconnect every 30 seconds up to 500 times", logger.error)
-            timeout = 500
-            j = 0
-            while j <= timeout:
-                try:
-                    globalDBClient.database_names()  # try to reconnect
-                    output("Connection restablished. Continuing...", logger.info)
-                    j = timeout
-                except pymongo.errors.AutoReconnect, e:
-                    if j == timeout:
-                        output("Connection to database could not be restablished. Now exiting...", logger.exception)
-                        quit()
-                    time.sleep(30)
-                j += 1
+            # Keep sampling, data points are spooled until the connection is restablished
+            readingWriter.connectionLost()
 
         except KeyboardInterrupt, e:
             output("\n\nManual quit", logger.error)
@@ -998,14 +2292,10 @@ def main():
             os.system("systemctl reboot")
             sys.exit(0)
 
-        finally:
-            uploadLog(log_path, settings['_id'])
-
 
 if __name__ == '__main__':
     output("\n\nStarted execution:\n\n", logger.info)
-    # Waits for internet connection (up to 3600 seconds), exits if not found.
-    waitForInternet(60*60*5)
+    # initialize() waits for the DB server, see waitForServer()
     while True:
         main()
 
@@ -0,0 +1,247 @@
+"""
+Scheduler
+
+Drift-free scheduling of periodic readings, at a single rate (TickScheduler) or at a different rate for
+each sensor (MultiRateScheduler).
+
+Ticks are aligned to absolute wall clock boundaries (multiples of 'period' since the UNIX Epoch, plus
+'offset'), e.g. on the minute for a 60 second period, so readings from many boards line up. Waiting is done
+on a monotonic clock, so jitter does not accumulate, and ticks are re-aligned if the wall clock is stepped
+(e.g. by NTP after boot).
+
+Ticks that passed before wait() was called (e.g. because a reading took longer than the period) are missed,
+and handled by one of the MISSED_TICK_POLICIES:
+    SKIP: Missed ticks are dropped, the next tick is the next boundary after the current time.
+    CATCHUP: Missed ticks are returned immediately, one after the other, up to 'max_catchup' of them.
+    COALESCE: The newest missed tick is returned immediately, older ones are dropped.
+
+Ticks returned by CATCHUP and COALESCE are in the past, see isLate().
+"""
+
+import ctypes
+import ctypes.util
+import heapq
+import math
+import os
+import time
+
+Scheduler_version = "1.0 Build 1"
+
+SKIP = 'skip'
+CATCHUP = 'catchup'
+COALESCE = 'coalesce'
+MISSED_TICK_POLICIES = (SKIP, CATCHUP, COALESCE)
+
+CLOCK_MONOTONIC = 1  # Linux clock id
+RESYNC_THRESHOLD = 1.0  # Difference (in seconds) between wall and monotonic clocks considered a clock step
+TICK_EPSILON = 1e-6  # Ticks closer than this (in seconds) are considered coincident
+LATE_THRESHOLD = 1.0  # Time (in seconds) after its tick a reading is considered late, see isLate()
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _monotonicClock():
+    # Returns a function returning the time of a monotonic clock, in seconds, falling back to time.time()
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    for library in ('c', 'rt'):
+        try:
+            clock_gettime = ctypes.CDLL(ctypes.util.find_library(library), use_errno=True).clock_gettime
+        except (OSError, AttributeError, TypeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+        timespec = _timespec()
+
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(timespec)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return timespec.tv_sec + timespec.tv_nsec*1e-9
+        try:
+            monotonic()
+        except OSError:
+            continue
+        return monotonic
+    return time.time
+
+
+monotonic = _monotonicClock()
+
+
+class MultiRateScheduler:
+    def __init__(self, periods, policy=SKIP, offset=0.0, max_catchup=10):
+        """
+        Schedules ticks for several channels (e.g. sensors), each every 'periods[i]' seconds, aligned to wall
+        clock boundaries of its own period. Channels whose ticks coincide (e.g. 10 and 60 second periods, on
+        the minute) are returned together.
+
+        Notes:
+            Pending ticks are kept on a priority queue (heapq), ordered by tick time.
+
+        Required Arguments:
+            periods (list): Time between ticks of each channel, in seconds. Channels with a period of 0 are
+            due on every call to wait().
+
+        Optional Arguments:
+            policy (str): One of the MISSED_TICK_POLICIES (Default SKIP), applied to each channel.
+            offset (float): Offset of the ticks from the boundaries, in seconds (Default 0).
+            max_catchup (int): Maximum number of missed ticks returned with the CATCHUP policy, older ones
+            are dropped (Default 10).
+
+        Exceptions:
+            Raises ValueError if a period is negative, there are no periods, or 'policy' is not one of the
+            MISSED_TICK_POLICIES.
+        """
+        if len(periods) == 0:
+            raise ValueError("No periods to schedule")
+        for period in periods:
+            if period < 0:
+                raise ValueError("Period must not be negative: " + str(period))
+        if policy not in MISSED_TICK_POLICIES:
+            raise ValueError("Unknown missed tick policy: " + str(policy))
+        self.periods = [float(i) for i in periods]
+        self.policy = policy
+        self.offset = float(offset)
+        self.max_catchup = max_catchup
+        self.__missed = 0
+        self.__resyncs = 0
+        self.__anchor()
+        self.__schedule(time.time())
+
+    def wait(self):
+        """
+        Sleeps until the next tick and returns a tuple (tick, channels), with its scheduled wall clock time
+        (UNIX Epoch timestamp) and the sorted list of indexes of the channels due.
+
+        Notes:
+            If ticks were missed, they are handled according to the policy and wait() returns without
+            sleeping, see missed().
+        """
+        self.__checkClock()
+        self.__handleMissed(self.__wall())
+        while True:
+            remaining = self.__heap[0][0] - self.__wall()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+            if self.__checkClock():
+                self.__handleMissed(self.__wall())
+        tick = self.__heap[0][0]
+        channels = []
+        while len(self.__heap) > 0 and self.__heap[0][0] - tick < TICK_EPSILON:
+            channels.append(heapq.heappop(self.__heap)[1:])
+        for channel, k in channels:
+            heapq.heappush(self.__heap, self.__entry(channel, k + 1))
+        return tick, sorted(i[0] for i in channels)
+
+    def missed(self):
+        """
+        Returns the number of ticks dropped since the scheduler was created, for all channels.
+        """
+        return self.__missed
+
+    def resyncs(self):
+        """
+        Returns the number of times the ticks were re-aligned after the wall clock was stepped.
+        """
+        return self.__resyncs
+
+    def isLate(self, tick, current=None):
+        """
+        Returns True if 'current' (Default: now, wall clock) is more than LATE_THRESHOLD seconds after 'tick',
+        e.g. for ticks returned by the CATCHUP or COALESCE policies, in which case readings should be stored
+        with the time they were taken instead of 'tick'.
+        """
+        if current is None:
+            current = time.time()
+        return current - tick > LATE_THRESHOLD
+
+    def __entry(self, channel, k):
+        # Heap entry for the 'k'th tick of 'channel', ticks are computed from k so coinciding ones compare equal
+        if self.periods[channel] == 0:
+            return (self.__wall(), channel, k)
+        return (k*self.periods[channel] + self.offset, channel, k)
+
+    def __schedule(self, current):
+        # (Re)starts all channels at their first tick boundary at or after 'current'
+        self.__heap = []
+        for channel in range(len(self.periods)):
+            if self.periods[channel] == 0:
+                k = 0
+            else:
+                k = int(math.ceil((current - self.offset)/self.periods[channel]))
+            heapq.heappush(self.__heap, self.__entry(channel, k))
+
+    def __handleMissed(self, current):
+        # Applies the missed tick policy to channels whose next tick has passed, or due with a period of 0
+        changed = False
+        for i in range(len(self.__heap)):
+            tick, channel, k = self.__heap[i]
+            period = self.periods[channel]
+            if period == 0:
+                self.__heap[i] = (current, channel, k)
+                changed = True
+                continue
+            if current <= tick:
+                continue
+            passed = int((current - tick)/period) + 1  # Ticks at or before 'current'
+            if self.policy == CATCHUP:
+                dropped = max(0, passed - self.max_catchup)
+            elif self.policy == COALESCE:
+                dropped = passed - 1
+            else:
+                dropped = passed
+            if dropped > 0:
+                self.__heap[i] = self.__entry(channel, k + dropped)
+                self.__missed += dropped
+                changed = True
+        if changed:
+            heapq.heapify(self.__heap)
+
+    def __anchor(self):
+        # Pairs wall and monotonic clock readings, the wall time is then estimated from the monotonic clock
+        self.__wall_anchor = time.time()
+        self.__monotonic_anchor = monotonic()
+
+    def __wall(self):
+        return self.__wall_anchor + monotonic() - self.__monotonic_anchor
+
+    def __checkClock(self):
+        # Re-aligns ticks if the wall clock has been stepped since the last anchor, returns True if it was
+        if abs(self.__wall() - time.time()) > RESYNC_THRESHOLD:
+            self.__anchor()
+            self.__schedule(time.time())
+            self.__resyncs += 1
+            return True
+        return False
+
+
+class TickScheduler(MultiRateScheduler):
+    def __init__(self, period, policy=SKIP, offset=0.0, max_catchup=10):
+        """
+        Schedules ticks every 'period' seconds, aligned to wall clock boundaries.
+
+        Required Arguments:
+            period (float): Time between ticks, in seconds. If 0, wait() returns immediately with the current
+            time.
+
+        Optional Arguments:
+            See MultiRateScheduler.
+
+        Exceptions:
+            Raises ValueError if 'period' is negative or 'policy' is not one of the MISSED_TICK_POLICIES.
+        """
+        MultiRateScheduler.__init__(self, [period], policy, offset, max_catchup)
+        self.period = self.periods[0]
+
+    def wait(self):
+        """
+        Sleeps until the next tick and returns its scheduled wall clock time (UNIX Epoch timestamp).
+
+        Notes:
+            If ticks were missed, they are handled according to the policy and wait() returns without
+            sleeping, see missed().
+        """
+        return MultiRateScheduler.wait(self)[0]
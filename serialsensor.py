@@ -3,6 +3,11 @@ import serial
 import time
 from serial.tools.list_ports import comports
 import traceback
+from array import array
+import select
+import threading
+import collections
+import Queue
 import sys
 
 SerialSensor_version = "1.1 Build 8"
@@ -11,6 +16,26 @@ CRLF = 0
 CR = 1
 LF = 2
 
+# Read modes
+WAIT_MODE = 0  # Wait for wait_time, then read the buffer
+LINE_MODE = 1  # Read as soon as a complete line arrives, up to wait_time
+
+# Timing profiles, delays (in seconds) after instantiating, before sending, after opening and after closing.
+# Adaptive profiles only wait until no data has been received for QUIET_TIME seconds, up to the delay.
+TIMING_PROFILES = {
+    'legacy': {'init': 0.4, 'send': 0.15, 'open': 0.8, 'close': 0.2, 'adaptive': False},
+    'adaptive': {'init': 0.4, 'send': 0.15, 'open': 0.8, 'close': 0.05, 'adaptive': True},
+    'fast': {'init': 0.0, 'send': 0.0, 'open': 0.0, 'close': 0.0, 'adaptive': False}
+}
+QUIET_TIME = 0.02
+
+# Streaming aggregations, applied to the values streamed since the last reading
+LATEST = 'latest'
+MEAN = 'mean'
+MINIMUM = 'min'
+MAXIMUM = 'max'
+AGGREGATIONS = (LATEST, MEAN, MINIMUM, MAXIMUM)
+
 
 def listPorts():
     return comports()
@@ -67,7 +92,9 @@ class SerialSensor:
                  parity='N',
                  stopbits=1,
                  timeout=5,
-                 writeTimeout=5
+                 writeTimeout=5,
+                 read_mode=WAIT_MODE,
+                 timing_profile='legacy'
                  ):
         """
         Instatiates a sensor.
@@ -91,18 +118,27 @@ class SerialSensor:
             stopbits (int): Default 1
             timeout (int): Default 5 seconds
             writeTimeout (int): Default 5 seconds
+            read_mode (int): WAIT_MODE (Default) waits for wait_time before reading the buffer, LINE_MODE
+            returns as soon as a complete line arrives, using wait_time as a deadline.
+            timing_profile (str or dict): Name of one of the TIMING_PROFILES, or a dictionary with the same
+            keys. 'legacy' (Default) uses fixed delays, 'adaptive' waits for the input buffer to be quiet
+            and 'fast' does not wait at all.
 
         Exceptions:
             Handles SerialException, SerialTimeoutException, TERMIOS errors, I.OError and OSError, and returns
             SerialErrors #0 (Cannot connect to device) or #5 (I/O Error).
 
             If an Unknown exception is raised, SerialError #0 is raised.
+            Raises SerialError #2 if timing_profile is not one of the TIMING_PROFILES.
         """
         self.__serial_port = serial_port
         self.__baud_rate = baud_rate
-        self.__name = name.replace(' ', '')
+        self.__name = str(name.replace(' ', ''))
         self.__readings = 0.00
-        self.__units = units.replace(' ', '')
+        self.__units = str(units.replace(' ', ''))
+        # Field schema: (name, units) pairs, in the order values are read, and index of each name
+        self.__fields = tuple(zip(self.__name.split(','), self.__units.split(',')))
+        self.__field_index = dict((self.__fields[i][0], i) for i in range(len(self.__fields)))
         self.__wait_time = wait_time
         self.__last_read_string = ""
         self.__enabled = True
@@ -112,11 +148,29 @@ class SerialSensor:
         self.__stopbits = stopbits
         self.__bytesize = bytesize
         self.__read_command = read_command
+        self.__read_mode = read_mode
+        self.__buffer = ''  # Holds partial lines received by readLine()
+        self.__streaming = False
+        self.__reader = None
+        self.__stream_error = None
+        self.__aggregation = LATEST
+        self.__callback = None
+        self.__window = collections.deque()
+        self.__stream_queue = None
+        self.__stream_lock = threading.Lock()
+        self.__commands = collections.deque()  # Commands queued by queueCommand()
+        self.__timings = {}  # Time spent on each phase of the last read(), see getTimings()
+        if isinstance(timing_profile, dict):
+            self.__timing = timing_profile
+        elif timing_profile in TIMING_PROFILES:
+            self.__timing = TIMING_PROFILES[timing_profile]
+        else:
+            raise SerialError("Invalid Data Type -> Unknown timing profile.", self.__name, self.__serial_port, 2, 'SerialSensor()', 'Timing profile: "' + str(timing_profile) + '"')
         try:
             self.__connection = Serial(serial_port, baud_rate, bytesize=bytesize, parity=parity,
                                        stopbits=stopbits, timeout=timeout, writeTimeout=writeTimeout)
             self.__connection.write('\r')  # Sometimes first commands are read as error, this prevents that
-
+            self.__settle(self.__timing['init'])  # Wait for receive buffer to fill, and discard it
         except serial.SerialException, e:
             raise SerialError("Could not connect to serial device during initialization.", self.__name, self.__serial_port, 0, 'SerialSensor()', e.message, source_exc_info=sys.exc_info())
         except termios.error:
@@ -129,10 +183,6 @@ class SerialSensor:
             raise SerialError("Unhandled error during initialization.", self.__name, self.__serial_port, 0, 'SerialSensor()', "Error: " + str(e), source_exc_info=sys.exc_info())
         except:
             raise SerialError("Unknown exception during initialization.", self.__name, self.__serial_port, 0, 'SerialSensor()', source_exc_info=sys.exc_info())
-        time.sleep(0.3)  # Wait for receive buffer to fill
-        self.__connection.flushInput()
-        self.__connection.flushInput()
-        time.sleep(0.1)
 
 #    def send_hex(self, command):
 #        self.__connection.flushInput()
@@ -158,25 +208,36 @@ class SerialSensor:
         if not self.__connection.isOpen():
             raise SerialError("Could not connect to serial device -> Connection closed.", self.__name, self.__serial_port, 0, 'send()', source_exc_info=sys.exc_info())
         try:
-            self.__connection.flushInput()
-            time.sleep(0.15)
+            self.__settle(self.__timing['send'])
+        except serial.SerialTimeoutException:
+            raise SerialError("Timeout on device -> SerialTimeoutException.", self.__name, self.__serial_port, 0, 'send()', "flushInput() call", source_exc_info=sys.exc_info())
+        except serial.SerialException, e:
+            raise SerialError("Could not connect to serial device -> SerialException.", self.__name, self.__serial_port, 0, 'send()', "flushInput() call " + e.message, source_exc_info=sys.exc_info())
         except termios.error:
             raise SerialError("Could not connect to serial device -> TERMIOS error.", self.__name, self.__serial_port, 0, 'send()', "flushInput() call", source_exc_info=sys.exc_info())
+        except IOError:
+            raise SerialError("Could not connect to serial device -> IOError.", self.__name, self.__serial_port, 5, 'send()', "flushInput() call", source_exc_info=sys.exc_info())
+        except OSError:
+            raise SerialError("Could not connect to serial device -> OSError.", self.__name, self.__serial_port, 5, 'send()', "flushInput() call", source_exc_info=sys.exc_info())
+        self.__write(command, 'send()')
+
+    def __write(self, command, function):
+        # Writes 'command' to the serial connection, without discarding received data
         command = str(command)  # Gets rid of unicode strings
         if command[-1:] != '\n' or command[-1:] != '\r':  # If line ending not defined, default to CR
             command += '\r'
         try:
             self.__connection.write(command)
         except serial.SerialTimeoutException:
-            raise SerialError("Timeout on device", self.__name, self.__serial_port, 0, 'send()', "write() call", source_exc_info=sys.exc_info())
+            raise SerialError("Timeout on device", self.__name, self.__serial_port, 0, function, "write() call", source_exc_info=sys.exc_info())
         except serial.SerialException, e:
-            raise SerialError("Could not connect to serial device -> SerialException.", self.__name, self.__serial_port, 0, 'send()', "write() call " + e.message, source_exc_info=sys.exc_info())
+            raise SerialError("Could not connect to serial device -> SerialException.", self.__name, self.__serial_port, 0, function, "write() call " + e.message, source_exc_info=sys.exc_info())
         except termios.error:
-            raise SerialError("Could not connect to serial device, TERMIOS error.", self.__name, self.__serial_port, 5, 'send()', "write() call", source_exc_info=sys.exc_info())
+            raise SerialError("Could not connect to serial device, TERMIOS error.", self.__name, self.__serial_port, 5, function, "write() call", source_exc_info=sys.exc_info())
         except IOError:
-            raise SerialError("Could not connect to serial device -> IOError.", self.__name, self.__serial_port, 5, 'send()', "write() call", source_exc_info=sys.exc_info())
+            raise SerialError("Could not connect to serial device -> IOError.", self.__name, self.__serial_port, 5, function, "write() call", source_exc_info=sys.exc_info())
         except OSError:
-            raise SerialError("Could not connect to serial device -> OSError.", self.__name, self.__serial_port, 5, 'send()', "write() call", source_exc_info=sys.exc_info())
+            raise SerialError("Could not connect to serial device -> OSError.", self.__name, self.__serial_port, 5, function, "write() call", source_exc_info=sys.exc_info())
 
     def readRaw(self):
         """
@@ -297,6 +358,85 @@ class SerialSensor:
             string += '\r\n'  # use CRLF as default
         return string
 
+    def readLine(self, mode=CRLF, timeout=None):
+        """
+        Returns the first complete line received, as soon as it arrives, waiting up to 'timeout' seconds.
+        Characters received after the line ending are kept in an internal buffer for the next call,
+        so lines split across reads are reassembled.
+        If no data is received before the timeout, a SerialError (Error #3) is raised.
+        If data is received but no EOL character, a SerialError (Error #6) is raised.
+        EOL from original string gets replaced by EOL set in the mode option.
+
+        Notes:
+            Empty lines (e.g. the LF in a CRLF line ending) are skipped.
+
+        Args:
+            mode (int): Line ending mode:
+                    0: CRLF
+                    1: CR
+                    2: LF
+            timeout (float): Time to wait for a complete line (in seconds). Defaults to wait_time.
+
+        Exceptions:
+            Handles SerialException, SerialTimeoutException, TERMIOS errors, IOError and OSError, and returns
+            SerialErrors #0 (Cannot connect to device) or #5 (I/O Error).
+            Throws SerialError #3 if no data has been received before the timeout.
+            Throws SerialError #6 if no line ending character has been received before the timeout.
+        """
+        if not self.__connection.isOpen():
+            raise SerialError("Could not connect to serial device -> Connection closed.", self.__name, self.__serial_port, 0, 'readLine()', source_exc_info=sys.exc_info())
+        if timeout is None:
+            timeout = self.getWaitTime()/1000
+        deadline = time.time() + timeout
+        string = self.__popLine()
+        while string is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                if len(self.__buffer) == 0:
+                    raise SerialError("No data read -> No data on receive buffer.", self.__name, self.__serial_port, 3, 'readLine()')
+                raise SerialError("Did not receive EOL character, assuming corrupted data.", self.__name, self.__serial_port, 6, 'readLine()', 'String received: "' + self.__buffer + '"')
+            try:
+                if hasattr(self.__connection, 'fileno'):
+                    select.select([self.__connection.fileno()], [], [], remaining)
+                else:
+                    time.sleep(min(remaining, 0.01))
+                waiting = self.__connection.inWaiting()
+                if waiting > 0:
+                    self.__buffer += self.__connection.read(waiting)
+            except serial.SerialTimeoutException:
+                raise SerialError("Timeout on device -> SerialTimeoutException.", self.__name, self.__serial_port, 0, 'readLine()', source_exc_info=sys.exc_info())
+            except serial.SerialException, e:
+                raise SerialError("Failed reading serial device -> SerialException.", self.__name, self.__serial_port, 0, 'readLine()', e.message, source_exc_info=sys.exc_info())
+            except termios.error:
+                raise SerialError("Could not connect to serial device -> TERMIOS error.", self.__name, self.__serial_port, 5, 'readLine()', source_exc_info=sys.exc_info())
+            except select.error:
+                raise SerialError("Could not connect to serial device -> select() error.", self.__name, self.__serial_port, 5, 'readLine()', source_exc_info=sys.exc_info())
+            except IOError:
+                raise SerialError("Could not connect to serial device -> IOError.", self.__name, self.__serial_port, 5, 'readLine()', source_exc_info=sys.exc_info())
+            except OSError:
+                raise SerialError("Could not connect to serial device -> OSError.", self.__name, self.__serial_port, 5, 'readLine()', source_exc_info=sys.exc_info())
+            except Exception, e:
+                raise SerialError("Unhandled error.", self.__name, self.__serial_port, 0, 'readLine()', "Error: " + str(e), source_exc_info=sys.exc_info())
+            string = self.__popLine()
+        self.__last_read_string = string
+        if mode == CR:
+            string += '\r'
+        elif mode == LF:
+            string += '\n'
+        else:
+            string += '\r\n'  # use CRLF as default
+        return string
+
+    def __popLine(self):
+        # Removes and returns the first complete line from the internal buffer, or None if there is none
+        self.__buffer = self.__buffer.lstrip('\r\n')
+        ends = [i for i in (self.__buffer.find('\r'), self.__buffer.find('\n')) if i != -1]
+        if len(ends) == 0:
+            return None
+        string = self.__buffer[:min(ends)]
+        self.__buffer = self.__buffer[min(ends) + 1:]
+        return string
+
 #    def check_connection(self, repair=False):
 #        result = self.__connection.isOpen()
 #        if not repair:
@@ -343,31 +483,182 @@ class SerialSensor:
 #        elif errno == 5:
 #            pass
 
-    def readValues(self):
+    def readValues(self, string=None):
         """
         Returns a float or a list of floats representing the numeric values in the string returned from readString().
 
+        Args:
+            string (str, optional): CRLF terminated string to be parsed in place of the one returned from
+            readString() (e.g. returned from readLine()).
+
         Exceptions:
             If there is a ValueError, readValues raises a SerialError #2 (Invalid Data Type).
         """
-        string = self.readString(CRLF)[:-2]
-        string = string.replace(' ', '')
-        if len(string) == 0:
-            return []
-        val_list = string.split(',')
+        return self.readRow(string).tolist()
+
+    def readRow(self, string=None):
+        """
+        Same as readValues(), but returns the values as a compact row of floats (array('d')).
+
+        Args:
+            string (str, optional): CRLF terminated string to be parsed in place of the one returned from
+            readString() (e.g. returned from readLine()).
+
+        Exceptions:
+            If there is a ValueError, readRow raises a SerialError #2 (Invalid Data Type).
+        """
+        if string is None:
+            string = self.readString(CRLF)
+        string = string[:-2].replace(' ', '')
         try:
-            values = [float(i) for i in val_list]
+            return self.__toRow(string)
         except ValueError:
             raise SerialError("Invalid data type received -> Cannot convert to float.",
                               self.__name, self.__serial_port,
                               2,
-                              'readValues()',
+                              'readRow()',
                               'Invalid string: "' + string + '"' + ', Original raw string: "' + self.__last_read_string + '"',
                               source_exc_info=sys.exc_info()
                               )
-        return values
 
-    def readJSON(self):
+    def parseRows(self, lines):
+        """
+        Parses many lines at once (e.g. a buffer with several readings) into rows of floats (array('d')).
+
+        Notes:
+            Empty lines, and lines that cannot be converted to floats, are skipped.
+
+        Args:
+            lines (str or list): String with CR and/or LF separated lines, or list of lines.
+
+        Returns:
+            list: Rows (array('d')), in the same order as the lines.
+        """
+        if isinstance(lines, basestring):
+            lines = lines.replace('\r', '\n').split('\n')
+        rows = []
+        for line in lines:
+            line = line.strip('\r\n').replace(' ', '')
+            if len(line) == 0:
+                continue
+            try:
+                rows.append(self.__toRow(line))
+            except ValueError:
+                pass
+        return rows
+
+    def buildJSON(self, row):
+        """
+        Returns the JSON dictionary (as in readJSON()) pairing the values in 'row' with the names and units
+        of the sensor.
+
+        Args:
+            row (list or array): Values, in the same order as read from the sensor.
+        """
+        x = min(len(row), len(self.__fields))
+        return dict((self.__fields[i][0], {"value": row[i], "units": self.__fields[i][1]}) for i in range(x))
+
+    def __toRow(self, string):
+        # Converts a comma separated string, with no line ending, to array('d'). Raises ValueError.
+        if len(string) == 0:
+            return array('d')
+        return array('d', [float(i) for i in string.split(',')])
+
+    def queueCommand(self, command, callback=None, reply=True):
+        """
+        Queues 'command' to be sent along with the next reading, or by runQueue().
+
+        Args:
+            command (str): ASCII string to be sent through the serial connection.
+            callback (function): If set, called as callback(command, reply, latency) once the reply is received,
+            where 'reply' is the line received (without line ending) and 'latency' the time between sending
+            the command and receiving the reply (in milliseconds).
+            reply (bool): False if the device does not reply to 'command'.
+        """
+        self.__commands.append((command, callback, reply))
+
+    def runQueue(self, timeout=None, max_in_flight=1, first_command=None):
+        """
+        Sends the commands queued by queueCommand() and matches the replies, one line per command, in the
+        same order the commands were sent (FIFO).
+
+        Notes:
+            - Up to 'max_in_flight' commands are sent before waiting for the oldest reply, the next command is
+            sent as soon as a reply is received, so no time is spent on fixed waits. Devices that only handle
+            one command at a time (such as the Air Board) require max_in_flight=1.
+            - Received data is discarded once, before the first command, as in send().
+            - If a reply is not received, the commands not yet replied to are queued again.
+
+        Args:
+            timeout (float): Time to wait for each reply, after its command is sent (in seconds). Defaults to
+            wait_time.
+            max_in_flight (int): Maximum number of commands sent and not yet replied to.
+            first_command (str): If set, sent before the queued commands, and not queued again on errors (used
+            by read() to send read_command).
+
+        Returns:
+            list: (command, reply, latency) tuples, in the order commands were sent, where 'reply' is the
+            line received (without line ending), or None for commands with no reply, and 'latency' is in
+            milliseconds.
+
+        Exceptions:
+            Raises the same SerialErrors as send() and readLine().
+        """
+        if timeout is None:
+            timeout = self.getWaitTime()/1000
+        commands = list(self.__commands)
+        self.__commands.clear()
+        if first_command is not None:
+            commands.insert(0, (first_command, None, True))
+        results = [None]*len(commands)
+        try:
+            self.__runCommands(commands, results, timeout, max_in_flight)
+        except SerialError:
+            # Queue again commands not replied to, in order
+            start = 0 if first_command is None else 1
+            self.__commands.extendleft(reversed([commands[i] for i in range(start, len(commands)) if results[i] is None]))
+            raise
+        for i in range(len(commands)):
+            if commands[i][1] is not None:
+                try:
+                    commands[i][1](*results[i])
+                except:
+                    pass
+        return results
+
+    def __runCommands(self, commands, results, timeout, max_in_flight):
+        # Sends 'commands', storing (command, reply, latency) tuples in 'results', see runQueue()
+        in_flight = collections.deque()
+        if not self.__connection.isOpen():
+            raise SerialError("Could not connect to serial device -> Connection closed.", self.__name, self.__serial_port, 0, 'runQueue()', source_exc_info=sys.exc_info())
+        try:
+            self.__settle(self.__timing['send'])
+        except serial.SerialTimeoutException:
+            raise SerialError("Timeout on device -> SerialTimeoutException.", self.__name, self.__serial_port, 0, 'runQueue()', "flushInput() call", source_exc_info=sys.exc_info())
+        except serial.SerialException, e:
+            raise SerialError("Could not connect to serial device -> SerialException.", self.__name, self.__serial_port, 0, 'runQueue()', "flushInput() call " + e.message, source_exc_info=sys.exc_info())
+        except termios.error:
+            raise SerialError("Could not connect to serial device -> TERMIOS error.", self.__name, self.__serial_port, 0, 'runQueue()', "flushInput() call", source_exc_info=sys.exc_info())
+        except IOError:
+            raise SerialError("Could not connect to serial device -> IOError.", self.__name, self.__serial_port, 5, 'runQueue()', "flushInput() call", source_exc_info=sys.exc_info())
+        except OSError:
+            raise SerialError("Could not connect to serial device -> OSError.", self.__name, self.__serial_port, 5, 'runQueue()', "flushInput() call", source_exc_info=sys.exc_info())
+        sent = 0
+        while sent < len(commands) or len(in_flight) > 0:
+            while sent < len(commands) and len(in_flight) < max_in_flight:
+                self.__write(commands[sent][0], 'runQueue()')
+                if commands[sent][2]:
+                    in_flight.append((sent, time.time()))
+                else:
+                    results[sent] = (commands[sent][0], None, 0.0)
+                sent += 1
+            if len(in_flight) > 0:
+                index, sent_at = in_flight[0]
+                reply = self.readLine(CRLF, max(0.0, sent_at + timeout - time.time()))[:-2]
+                in_flight.popleft()
+                results[index] = (commands[index][0], reply, (time.time() - sent_at)*1000)
+
+    def readJSON(self, string=None):
         """
         Returns a JSON dictionary with the measurements taken:
 
@@ -407,29 +698,28 @@ class SerialSensor:
             Note that names and units form their respective pairs in the same order as the values are read
             from the sensor, as well as there are the same number of names, units and values available to
             be paired, in this example, 3.
+
+        Args:
+            string (str, optional): CRLF terminated string to be parsed, passed on to readValues().
         """
-        names = self.getName().split(',')
-        units = self.getUnits().split(',')
-        values = self.readValues()
-        json_dict = {}
-        if (len(values) > len(names)):
-            x = len(names)
-        elif (len(values) > len(units)):
-            x = len(units)
-        else:
-            x = len(values)
-        for i in range(x):
-            json_dict.update({names[i]: {"value": values[i], "units": units[i]}})
-        return json_dict
+        return self.buildJSON(self.readRow(string))
 
     def read(self, forced_command=None):
         """
         Executes 3 commands in sequence:
             1. Sends read_command to the serial device
-            2. Waits for wait_time milliseconds.
+            2. Waits for wait_time milliseconds (or, in LINE_MODE, until a complete line arrives, up to
+            wait_time milliseconds).
             3. Reads and returns JSON dictionary of values, names and units.
 
-        Note that read_command must have been defined when the sensor was initialized.
+        Note that read_command must have been defined when the sensor was initialized, unless the sensor is
+        streaming, in which case the values streamed since the last reading are returned, aggregated, by
+        readAggregate().
+
+        If commands have been queued by queueCommand(), they are sent right after read_command, and their
+        replies are matched by runQueue().
+
+        The time spent on each phase of the reading is available from getTimings().
 
         Args:
             forced_command (str or function): If set, forces read() to use the provided command in place of
@@ -439,6 +729,12 @@ class SerialSensor:
             Raises SerialError #2 if read_command has not been defined when initialized.
 
         """
+        self.__timings = {}
+        if self.__streaming:
+            start = time.time()
+            reading = self.readAggregate()
+            self.__timings['read'] = time.time() - start
+            return reading
         if forced_command is None:
             command = self.__read_command
         else:
@@ -446,14 +742,178 @@ class SerialSensor:
         if command is None:
             raise SerialError("Invalid Data Type -> No read_command set, nothing to send.", self.__name, self.__serial_port, 2, 'read()', source_exc_info=sys.exc_info())
         if callable(command):
-            self.send(command())
+            command = command()
+        start = time.time()
+        if len(self.__commands) > 0:
+            # Send queued commands along with the reading
+            string = self.runQueue(first_command=command)[0][1] + '\r\n'
+            self.__timings['wait'] = time.time() - start
         else:
             self.send(command)
-        time.sleep(self.getWaitTime()/1000)
-        reading = self.readJSON()
+            self.__timings['send'] = time.time() - start
+            start = time.time()
+            if self.__read_mode == LINE_MODE:
+                string = self.readLine(CRLF, self.getWaitTime()/1000)
+                self.__timings['wait'] = time.time() - start
+            else:
+                time.sleep(self.getWaitTime()/1000)
+                self.__timings['wait'] = time.time() - start
+                start = time.time()
+                string = self.readString(CRLF)
+                self.__timings['read'] = time.time() - start
+        start = time.time()
+        reading = self.readJSON(string)
+        self.__timings['parse'] = time.time() - start
         # self.close()
         return reading
 
+    def startStreaming(self, aggregation=LATEST, callback=None, window_size=10000, queue_size=100):
+        """
+        Starts reading a free-running sensor (one that sends values continuously, without a read_command)
+        on a background thread. Every complete line received is parsed into values, which are:
+            - Kept on a window of up to 'window_size' values, aggregated and cleared by readAggregate()
+            (and so by read()).
+            - Passed on, as a JSON dictionary, to 'callback', if set.
+            - Queued, up to the newest 'queue_size' values, to be retrieved by the stream() generator.
+
+        Notes:
+            - Lines that cannot be parsed are ignored.
+            - If an I/O error occurs the background thread stops, and the error is raised on the next call
+            to readAggregate(). The thread is restarted by open().
+
+        Args:
+            aggregation (str): One of AGGREGATIONS: LATEST (Default), MEAN, MINIMUM or MAXIMUM.
+            callback (function): Function called with the JSON dictionary of each line received.
+            window_size (int): Maximum number of values kept between readings.
+            queue_size (int): Maximum number of values queued for stream().
+
+        Exceptions:
+            Raises SerialError #2 if aggregation is not one of AGGREGATIONS.
+        """
+        if aggregation not in AGGREGATIONS:
+            raise SerialError("Invalid Data Type -> Unknown aggregation.", self.__name, self.__serial_port, 2, 'startStreaming()', 'Aggregation: "' + str(aggregation) + '"')
+        self.__aggregation = aggregation
+        self.__callback = callback
+        self.__window = collections.deque(maxlen=window_size)
+        self.__stream_queue = Queue.Queue(queue_size)
+        self.__streaming = True
+        self.__startReader()
+
+    def stopStreaming(self):
+        """
+        Stops the background reader started by startStreaming().
+        """
+        self.__streaming = False
+        if self.__reader is not None and self.__reader is not threading.current_thread():
+            self.__reader.join()
+        self.__reader = None
+
+    def isStreaming(self):
+        """
+        Returns True if the sensor is streaming, False otherwise.
+        """
+        return self.__streaming
+
+    def stream(self, timeout=None):
+        """
+        Generator yielding the JSON dictionary of each line received while streaming, oldest first.
+
+        Args:
+            timeout (float): Time to wait for a new line (in seconds), if None waits while streaming.
+        """
+        while self.__streaming:
+            try:
+                values = self.__stream_queue.get(timeout=1.0 if timeout is None else timeout)
+            except Queue.Empty:
+                if timeout is not None:
+                    return
+                continue
+            yield self.buildJSON(values)
+
+    def waitForStream(self, timeout):
+        """
+        Waits up to 'timeout' seconds for values to be streamed, see startStreaming().
+
+        Returns:
+            True if values have been streamed since the last reading, or if the background reader stopped on
+            an error (raised by the next readAggregate()), False otherwise.
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self.__stream_lock:
+                if len(self.__window) > 0 or self.__stream_error is not None:
+                    return True
+            if not self.__streaming or time.time() >= deadline:
+                return False
+            time.sleep(min(QUIET_TIME, max(0.0, deadline - time.time())))
+
+    def readAggregate(self, aggregation=None):
+        """
+        Returns a JSON dictionary (as in readJSON()) with the values streamed since the last reading,
+        aggregated, and clears them.
+
+        Args:
+            aggregation (str): One of AGGREGATIONS, if None the aggregation set in startStreaming() is used.
+
+        Exceptions:
+            Raises the SerialError that stopped the background reader, if any.
+            Throws SerialError #3 if no values have been streamed since the last reading.
+        """
+        if self.__stream_error is not None:
+            e = self.__stream_error
+            self.__stream_error = None
+            raise e
+        if aggregation is None:
+            aggregation = self.__aggregation
+        with self.__stream_lock:
+            window = list(self.__window)
+            self.__window.clear()
+        if len(window) == 0:
+            raise SerialError("No data read -> No data streamed since last reading.", self.__name, self.__serial_port, 3, 'readAggregate()')
+        if aggregation == LATEST:
+            return self.buildJSON(window[-1])
+        x = min(len(i) for i in window)
+        if aggregation == MINIMUM:
+            values = [min(i[j] for i in window) for j in range(x)]
+        elif aggregation == MAXIMUM:
+            values = [max(i[j] for i in window) for j in range(x)]
+        else:
+            values = [sum(i[j] for i in window)/len(window) for j in range(x)]
+        return self.buildJSON(values)
+
+    def __startReader(self):
+        self.__stream_error = None
+        self.__reader = threading.Thread(target=self.__readStream, name="SerialSensor " + self.__serial_port)
+        self.__reader.daemon = True
+        self.__reader.start()
+
+    def __readStream(self):
+        # Background reader, see startStreaming()
+        while self.__streaming and self.__connection.isOpen():
+            try:
+                values = self.readRow(self.readLine(CRLF, 1.0))
+            except SerialError, e:
+                if e.errno in (2, 3, 6):  # Invalid, missing or incomplete line, keep reading
+                    continue
+                if self.__connection.isOpen():
+                    self.__stream_error = e
+                return
+            with self.__stream_lock:
+                self.__window.append(values)
+            try:
+                self.__stream_queue.put_nowait(values)
+            except Queue.Full:
+                try:
+                    self.__stream_queue.get_nowait()  # Drop oldest
+                    self.__stream_queue.put_nowait(values)
+                except (Queue.Empty, Queue.Full):
+                    pass
+            if self.__callback is not None:
+                try:
+                    self.__callback(self.buildJSON(values))
+                except:
+                    pass
+
     def open(self):
         """
         Opens the serial connection.
@@ -466,9 +926,9 @@ class SerialSensor:
         """
         try:
             self.__connection.open()
-            time.sleep(0.4)
-            self.__connection.flushInput()
-            time.sleep(0.4)
+            self.__settle(self.__timing['open'])
+            if self.__streaming and (self.__reader is None or not self.__reader.is_alive()):
+                self.__startReader()
         except serial.SerialTimeoutException:
             raise SerialError("Timeout on device -> SerialTimeoutException.", self.__name, self.__serial_port, 0, 'open()', source_exc_info=sys.exc_info())
         except SerialException, e:
@@ -489,7 +949,23 @@ class SerialSensor:
         Closes the serial connection.
         """
         self.__connection.close()
-        time.sleep(0.2)
+        time.sleep(self.__timing['close'])
+
+    def __settle(self, delay):
+        # Discards received data, waiting 'delay' seconds, or, if the timing profile is adaptive, until no data
+        # has been received for QUIET_TIME seconds, up to 'delay' seconds.
+        if not self.__timing['adaptive']:
+            time.sleep(delay)
+            self.__connection.flushInput()
+        else:
+            deadline = time.time() + delay
+            self.__connection.flushInput()
+            while time.time() < deadline:
+                time.sleep(min(QUIET_TIME, max(0.0, deadline - time.time())))
+                if self.__connection.inWaiting() == 0:
+                    break
+                self.__connection.flushInput()
+        self.__buffer = ''
 
     def isEnabled(self):
         """
@@ -510,7 +986,7 @@ class SerialSensor:
         """
         Returns string corresponding to the name of the sensor as defined during initialization.
         """
-        return str(self.__name)
+        return self.__name
 
     def getPort(self):
         """
@@ -531,6 +1007,18 @@ class SerialSensor:
         """
         return self.__read_command
 
+    def getReadMode(self):
+        """
+        Returns WAIT_MODE or LINE_MODE, as defined during initialization.
+        """
+        return self.__read_mode
+
+    def getTimingProfile(self):
+        """
+        Returns the timing profile dictionary, as defined during initialization.
+        """
+        return self.__timing
+
     def getBaud(self):
         """
         Returns numeric value corresponding to the baud_rate of the sensor as defined during initialization.
@@ -541,7 +1029,32 @@ class SerialSensor:
         """
         Returns string corresponding to the units of the sensor as defined during initialization.
         """
-        return str(self.__units)
+        return self.__units
+
+    def getFields(self):
+        """
+        Returns tuple of (name, units) pairs, in the same order values are read from the sensor.
+        """
+        return self.__fields
+
+    def getFieldIndex(self, name):
+        """
+        Returns the index of the value named 'name' in the values read from the sensor, or None if not found.
+        """
+        return self.__field_index.get(name)
+
+    def getTimings(self):
+        """
+        Returns a dictionary with the time (in seconds) spent on each phase of the last read():
+
+            'send': Settling the input buffer and sending read_command.
+            'wait': Waiting for the reply (in LINE_MODE, or with queued commands, includes reading it).
+            'read': Reading the reply (or, when streaming, aggregating the streamed values).
+            'parse': Parsing the reply into the JSON dictionary.
+
+        Only the phases of the last read() are present.
+        """
+        return dict(self.__timings)
 
     def getLastString(self):
         """
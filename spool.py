@@ -0,0 +1,188 @@
+"""
+Spool
+
+Durable, append-only on-disk queue used to keep data points while the database cannot be reached.
+
+Records are appended as JSON lines to numbered segment files in the spool directory. Writes are synced to
+disk in batches (every 'sync_every' records or 'sync_interval' seconds), segments are rotated once they
+reach 'segment_size' bytes, and the oldest segments are evicted once the spool grows past 'max_size'
+bytes, so the SD card cannot be filled up.
+
+Segments are replayed oldest first, preserving the order in which records were appended.
+"""
+
+import os
+import time
+from bson import json_util
+
+Spool_version = "1.0 Build 1"
+
+SEGMENT_EXTENSION = '.seg'
+
+
+class Spool:
+    def __init__(self, path,
+                 max_size=50*1024*1024,
+                 segment_size=1024*1024,
+                 sync_every=10,
+                 sync_interval=5.0
+                 ):
+        """
+        Opens (or creates) the spool at 'path'.
+
+        Required Arguments:
+            path (str): Spool directory, created if it does not exist.
+
+        Optional Arguments:
+            max_size (int): Maximum size of the spool in bytes, oldest segments are evicted past this
+            size (Default 50MB).
+            segment_size (int): Size in bytes after which a new segment is started (Default 1MB).
+            sync_every (int): Number of records appended between fsync() calls (Default 10).
+            sync_interval (float): Maximum time in seconds between fsync() calls (Default 5 seconds).
+
+        Exceptions:
+            Raises OSError if the spool directory cannot be created.
+        """
+        self.__path = path
+        self.__max_size = max_size
+        self.__segment_size = segment_size
+        self.__sync_every = sync_every
+        self.__sync_interval = sync_interval
+        self.__file = None
+        self.__unsynced = 0
+        self.__last_sync = time.time()
+        self.__evicted = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def append(self, records):
+        """
+        Appends a list of JSON serializable records to the current segment.
+
+        Notes:
+            Records are only guaranteed to be on disk after the next sync, see sync().
+
+        Args:
+            records (list): Records to be appended, in order.
+        """
+        if self.__file is None:
+            self.__file = open(self.__segmentPath(self.__nextSegment()), 'a')
+        for record in records:
+            self.__file.write(json_util.dumps(record) + '\n')
+        self.__unsynced += len(records)
+        if self.__unsynced >= self.__sync_every or time.time() - self.__last_sync >= self.__sync_interval:
+            self.sync()
+        if self.__file.tell() >= self.__segment_size:
+            self.rotate()
+        self.__evict()
+
+    def sync(self):
+        """
+        Flushes and syncs the current segment to disk.
+        """
+        if self.__file is not None and self.__unsynced > 0:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+        self.__unsynced = 0
+        self.__last_sync = time.time()
+
+    def rotate(self):
+        """
+        Syncs and closes the current segment, the next append() starts a new segment.
+        """
+        if self.__file is not None:
+            self.sync()
+            self.__file.close()
+            self.__file = None
+
+    def isEmpty(self):
+        """
+        Returns True if there are no records in the spool.
+        """
+        return len(self.__segments()) == 0
+
+    def size(self):
+        """
+        Returns the size of the spool on disk, in bytes.
+
+        Notes:
+            May be called from other threads while segments are being removed, segments removed meanwhile
+            are not counted.
+        """
+        return sum(self.__segmentSize(i) for i in self.__segments())
+
+    def evicted(self):
+        """
+        Returns the number of segments evicted since the spool was opened.
+        """
+        return self.__evicted
+
+    def oldest(self):
+        """
+        Returns the oldest segment as a tuple (segment, records), or None if the spool is empty.
+
+        Notes:
+            - The current segment is rotated if it is the oldest one, so records appended meanwhile go to
+            a new segment.
+            - Lines that cannot be parsed (e.g. partially written during a power loss) are skipped.
+            - The segment is only removed from the spool by remove(), once its records have been stored.
+        """
+        segments = self.__segments()
+        if len(segments) == 0:
+            return None
+        if self.__file is not None and self.__file.name == self.__segmentPath(segments[0]):
+            self.rotate()
+        records = []
+        with open(self.__segmentPath(segments[0])) as segment_file:
+            for line in segment_file:
+                try:
+                    records.append(json_util.loads(line))
+                except ValueError:
+                    pass
+        return segments[0], records
+
+    def remove(self, segment):
+        """
+        Removes 'segment' (as returned by oldest()) from the spool.
+        """
+        try:
+            os.remove(self.__segmentPath(segment))
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        Syncs and closes the spool.
+        """
+        self.rotate()
+
+    def __segments(self):
+        # Returns sorted list of segment numbers on disk
+        return sorted(int(i[:-len(SEGMENT_EXTENSION)]) for i in os.listdir(self.__path)
+                      if i.endswith(SEGMENT_EXTENSION) and i[:-len(SEGMENT_EXTENSION)].isdigit())
+
+    def __nextSegment(self):
+        segments = self.__segments()
+        if len(segments) == 0:
+            return 0
+        return segments[-1] + 1
+
+    def __segmentPath(self, segment):
+        return os.path.join(self.__path, '%020d' % segment + SEGMENT_EXTENSION)
+
+    def __segmentSize(self, segment):
+        # Returns the size of 'segment' in bytes, 0 if it has already been removed
+        try:
+            return os.path.getsize(self.__segmentPath(segment))
+        except OSError:
+            return 0
+
+    def __evict(self):
+        # Drops oldest segments, never the current one, until the spool fits in max_size
+        segments = self.__segments()
+        size = self.size()
+        while size > self.__max_size and len(segments) > 1:
+            segment = segments.pop(0)
+            size -= self.__segmentSize(segment)
+            self.remove(segment)
+            self.__evicted += 1
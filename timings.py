@@ -0,0 +1,156 @@
+"""
+Timings
+
+Rolling per-phase timing statistics, used to find out where the time of each sampling cycle goes.
+
+Durations are recorded per phase (e.g. 'settings_check', 'db_insert') and only the newest 'window_size'
+durations of each phase are kept. Summaries include count, min/max/mean, percentiles and a histogram over
+fixed HISTOGRAM_BOUNDS, and can be written to a local JSON stats file with dump().
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+Timings_version = "1.0 Build 1"
+
+# Upper bounds (in seconds) of the histogram buckets, the last bucket holds anything longer
+HISTOGRAM_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)
+PERCENTILES = (50, 90, 99)
+
+
+class RollingHistogram:
+    def __init__(self, window_size=1000):
+        """
+        Keeps the newest 'window_size' values added.
+
+        Optional Arguments:
+            window_size (int): Number of values kept (Default 1000).
+        """
+        self.__values = collections.deque(maxlen=window_size)
+        self.__total = 0
+
+    def add(self, value):
+        """
+        Adds 'value', dropping the oldest one if the window is full.
+        """
+        self.__values.append(value)
+        self.__total += 1
+
+    def count(self):
+        """
+        Returns the number of values added since the histogram was created, including dropped ones.
+        """
+        return self.__total
+
+    def percentile(self, p):
+        """
+        Returns the 'p'th percentile (0 to 100) of the values in the window, or None if it is empty.
+        """
+        return self.__percentile(sorted(self.__values), p)
+
+    def summary(self):
+        """
+        Returns a dictionary with the count, min, max, mean, PERCENTILES ('p50', ...) and histogram of the
+        values in the window. The histogram is a list of [upper bound, count] pairs, None being the bound of
+        the last bucket.
+        """
+        values = sorted(self.__values)
+        summary = {'count': self.__total, 'window': len(values)}
+        if len(values) == 0:
+            return summary
+        summary['min'] = values[0]
+        summary['max'] = values[-1]
+        summary['mean'] = sum(values)/len(values)
+        for p in PERCENTILES:
+            summary['p' + str(p)] = self.__percentile(values, p)
+        histogram = [[i, 0] for i in HISTOGRAM_BOUNDS] + [[None, 0]]
+        bucket = 0
+        for i in values:
+            while bucket < len(HISTOGRAM_BOUNDS) and i > HISTOGRAM_BOUNDS[bucket]:
+                bucket += 1
+            histogram[bucket][1] += 1
+        summary['histogram'] = [i for i in histogram if i[1] > 0]
+        return summary
+
+    def __percentile(self, values, p):
+        # Nearest-rank percentile of sorted 'values'
+        if len(values) == 0:
+            return None
+        return values[min(len(values) - 1, max(0, int(round(p/100.0*len(values))) - 1))]
+
+
+class Timings:
+    def __init__(self, window_size=1000):
+        """
+        Per-phase RollingHistograms, safe to use from several threads.
+
+        Optional Arguments:
+            window_size (int): Number of durations kept per phase (Default 1000).
+        """
+        self.__window_size = window_size
+        self.__phases = {}
+        self.__lock = threading.Lock()
+        self.__start_time = time.time()
+
+    def add(self, phase, duration):
+        """
+        Records 'duration' (in seconds) for 'phase'.
+        """
+        with self.__lock:
+            if phase not in self.__phases:
+                self.__phases[phase] = RollingHistogram(self.__window_size)
+            self.__phases[phase].add(duration)
+
+    def time(self, phase):
+        """
+        Returns a context manager recording the time spent inside it for 'phase', e.g.:
+
+            with timings.time('db_insert'):
+                insertData(...)
+
+        The duration is recorded even if an exception is raised.
+        """
+        return _PhaseTimer(self, phase)
+
+    def summary(self):
+        """
+        Returns a dictionary with the summary (see RollingHistogram.summary()) of each phase.
+        """
+        with self.__lock:
+            phases = dict(self.__phases)
+        return dict((i, phases[i].summary()) for i in phases)
+
+    def dump(self, path):
+        """
+        Writes the summary of all phases to the JSON file at 'path'.
+
+        Notes:
+            The file is written to a temporary file first and then renamed, so readers never see a partially
+            written file.
+
+        Exceptions:
+            Raises IOError or OSError if the file cannot be written.
+        """
+        stats = {'date': time.time(), 'uptime': time.time() - self.__start_time, 'phases': self.summary()}
+        with open(path + '.tmp', 'w') as stats_file:
+            json.dump(stats, stats_file, indent=4, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+
+class _PhaseTimer:
+    # Context manager returned by Timings.time()
+    def __init__(self, timings, phase):
+        self.__timings = timings
+        self.__phase = phase
+        self.__start = None
+
+    def __enter__(self):
+        self.__start = time.time()
+        return self
+
+    def __exit__(self, _type, _value, _traceback):
+        self.__timings.add(self.__phase, time.time() - self.__start)
+        return False
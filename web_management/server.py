@@ -5,6 +5,7 @@ import collections
 import json
 import time
 import copy
+import hashlib
 
 # Flask Imports
 from flask import Flask
@@ -12,10 +13,34 @@ from flask import request
 from flask import render_template
 from flask import jsonify
 from flask import abort
+from flask import make_response
+from flask import Response
+from flask import stream_with_context
 from flask import Blueprint
 bp = Blueprint("web_management", __name__, template_folder="templates",
                static_folder="static")
 boards = {}
+# Collections on which the index used by data queries has already been created
+indexed_collections = set()
+DATA_POINTS = 500  # Default number of points returned by data queries
+MAX_DATA_POINTS = 5000  # Maximum number of points returned by data queries
+DATA_FIELDS_SAMPLE = 100  # Number of most recent readings (or buckets) measurement names are gathered from
+BOARDS_PER_PAGE = 50  # Default number of boards listed per page on the selection page
+MAX_BOARDS_PER_PAGE = 500  # Maximum number of boards listed per page on the selection page
+SELECTION_CACHE_TTL = 10  # Time in seconds the board listing is cached for
+SELECTION_CACHE_SIZE = 50  # Maximum number of cached board listings, least recently used are evicted
+# Cached board listings, least recently used first, format: {(page, per_page): (time, pages, ordered_dbs)}
+selection_cache = collections.OrderedDict()
+# Cached schema structures, keyed by the shape hash of the board settings, see build_schema_board()
+schema_cache = {}
+SCHEMA_CACHE_SIZE = 100  # Maximum number of cached schema structures
+LOG_CHUNK_LINES = 500  # Number of log lines fetched from the DB at a time when streaming logs
+LOG_TAIL_LINES = 1000  # Default number of lines shown on the log page
+LOG_POLL_INTERVAL = 2  # Time in seconds between checks for new lines when following a log
+LOG_KEEPALIVE_INTERVAL = 15  # Time in seconds between keep-alive comments when following a log
+STALE_HEARTBEAT_INTERVALS = 3  # Number of missed heartbeats (or readings) after which a board is stalled
+# Settings and sensor settings that may be left blank, not required on the form, and shown as strings
+OPTIONAL_SETTINGS = ('stream_aggregation', 'status_command', 'reading_frequency', 'reachability_targets')
 
 # Mongo Imports
 import pymongo
@@ -29,7 +54,13 @@ try:
     client.admin.authenticate("", "")
     board_collection = client['admin']['boards']  # Default DB and collection for storing board settings
     log_collection = client['admin']['log']  # Default DB and collection for storing logs
+    heartbeat_collection = client['admin']['heartbeat']  # Default DB and collection for storing heartbeats
     # Note that logs and settings are stored with the same ObjectId, which also corresponds to the board's Id
+    # Index used to list boards sorted by db and hostname on the selection page
+    board_collection.create_index([('settings.value.db_name.value', pymongo.ASCENDING),
+                                   ('settings.value.hostname.value', pymongo.ASCENDING)])
+    # Index used to list heartbeats, oldest first, on the fleet overview
+    heartbeat_collection.create_index('date')
 except pymongo.errors.ConnectionFailure:
     sys.exit(0)
 
@@ -38,36 +69,14 @@ except pymongo.errors.ConnectionFailure:
 
 @bp.route("/", methods=['GET'])
 def board_selection():
-    cursor = board_collection.find()
-    if cursor.count() == 0:
-        return render_template("web_management/selection.html", dbs={})
-    db_names = {}
-    for i in cursor:
-        try:
-            db_names[i['settings']['value']['db_name']['value']]
-        except:
-            # Create db entry if it does not exist
-            db_names[i['settings']['value']['db_name']['value']] = {}
-        # Contains board info, with id as keys for a certain db above
-        ids = {}
-        ids[i['_id']] = {
-            "collection_name": i['settings']['value']['collection_name']['value'],
-            "hostname": i['settings']['value']['hostname']['value'],
-            "_id": i['_id'],
-            "status": i['status']['value']
-        }
-        db_names[i['settings']['value']['db_name']['value']].update(ids)
-    # format: db_names = {db_1: {collection_1:{collection_1, hostname, _id}, ...}, ...}
-    def getKey(item):
-        return db_names[db][item]['hostname']
-    ordered_dbs = collections.OrderedDict()  # Empty OrderedDict
-    for db in sorted(db_names):
-        # Create empty OrderedDicts for each board in a specific db
-        ordered_dbs[db] = collections.OrderedDict()
-        for _id_ in sorted(db_names[db], key=getKey):
-            ordered_dbs[db].update({_id_: db_names[db][_id_]})
-    #print json_util.dumps(ordered_dbs.iteritems())
-    return render_template("web_management/selection.html", dbs=ordered_dbs)
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(MAX_BOARDS_PER_PAGE, max(1, int(request.args.get('per_page', BOARDS_PER_PAGE))))
+    except ValueError:
+        return abort(400)
+    ordered_dbs, pages = listBoards(page, per_page)
+    return render_template("web_management/selection.html", dbs=ordered_dbs, page=page, pages=pages,
+                           per_page=per_page)
 
 
 @bp.route("/boards/<Id>/", methods=['GET', 'POST'])
@@ -107,12 +116,12 @@ def board_menu(Id):
 
 @bp.route("/boards/<Id>/log/", methods=['GET'])
 def board_log(Id):
-    board_info = findLogById(Id)
+    # The log itself is loaded by the page from board_log_text() and board_log_follow()
+    board_info = findBoardById(Id)
     if board_info is None:
         return abort(404)
-    log_str = board_info['contents'].replace('"', "'").replace('\n', '<br>')
     return render_template("web_management/logs.html",
-                           log_file=log_str[:-1],
+                           tail=LOG_TAIL_LINES,
                            collection_name=board_info['settings']['value']['collection_name']['value'],
                            hostname=board_info['settings']['value']['hostname']['value'],
                            ip=board_info['ip']['value'],
@@ -122,6 +131,89 @@ def board_log(Id):
                            status=board_info['status']['value'])
 
 
+@bp.route("/boards/<Id>/log/text/", methods=['GET'])
+def board_log_text(Id):
+    """
+    Streams the board's log as plain text, in chunks of LOG_CHUNK_LINES lines.
+
+    Lines are addressed by offset, the number of lines uploaded by the board before them. Arguments:
+        tail: Returns only the newest 'tail' lines.
+        offset: Returns lines starting at 'offset' (Default oldest stored line).
+        limit: Returns up to 'limit' lines.
+
+    The X-Log-Offset and X-Log-Total headers hold the offset of the first line returned and the offset
+    following the newest line, which can be used as 'offset' to page through the log or to start following
+    it with board_log_follow().
+    """
+    count = findLogCount(Id)
+    if count is None:
+        return abort(404)
+    total, stored = count
+    try:
+        if 'tail' in request.args:
+            start = total - int(request.args['tail'])
+        else:
+            start = int(request.args.get('offset', 0))
+        end = total
+        if 'limit' in request.args:
+            end = min(total, start + int(request.args['limit']))
+    except ValueError:
+        return abort(400)
+    start = max(start, total - stored)  # Older lines are no longer stored
+
+    def generate():
+        for lines in iterLogLines(Id, start, end, total):
+            yield '\n'.join(lines) + '\n'
+    response = Response(stream_with_context(generate()), mimetype='text/plain')
+    response.headers['X-Log-Offset'] = str(start)
+    response.headers['X-Log-Total'] = str(total)
+    return response
+
+
+@bp.route("/boards/<Id>/log/follow/", methods=['GET'])
+def board_log_follow(Id):
+    """
+    Follows the board's log as Server-Sent Events, one event per line with the line's offset as event id.
+
+    Starts at 'offset' (or after the Last-Event-ID header, when the browser reconnects), by default only
+    lines uploaded after the request are sent. The log is checked for new lines every LOG_POLL_INTERVAL
+    seconds.
+    """
+    count = findLogCount(Id)
+    if count is None:
+        return abort(404)
+    try:
+        if 'Last-Event-ID' in request.headers:
+            offset = int(request.headers['Last-Event-ID']) + 1
+        else:
+            offset = int(request.args.get('offset', count[0]))
+    except ValueError:
+        return abort(400)
+
+    def generate(offset):
+        last_event = time.time()
+        while True:
+            count = findLogCount(Id)
+            if count is None:
+                return
+            total, stored = count
+            if offset > total:
+                offset = 0  # Log was reset, start again from its oldest line
+            offset = max(offset, total - stored)
+            for lines in iterLogLines(Id, offset, total, total):
+                for line in lines:
+                    yield 'id: %d\ndata: %s\n\n' % (offset, line)
+                    offset += 1
+                last_event = time.time()
+            if time.time() - last_event >= LOG_KEEPALIVE_INTERVAL:
+                yield ': keep-alive\n\n'
+                last_event = time.time()
+            time.sleep(LOG_POLL_INTERVAL)
+    response = Response(stream_with_context(generate(offset)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 # @bp.route("/boards/<Id>/advanced/", methods=['GET', 'POST'])
 # def board_menu_advanced(Id):
 #     board_info = findBoardById(Id)
@@ -162,13 +254,119 @@ def board_log(Id):
 
 
 # JSON get requests:
+@bp.route('/fleet/', methods=['GET'])
+def fleet_overview():
+    """
+    Returns the latest heartbeat of every board (see publishHeartbeat() in rpi_service.py), oldest first,
+    flagged as 'stalled' if no heartbeat or no reading arrived within 'stale' seconds (default
+    STALE_HEARTBEAT_INTERVALS heartbeat intervals or reading periods), and as 'slow' if readings take
+    longer than the reading frequency.
+
+    Response format:
+        {"date": ..., "boards": N, "stalled": N, "slow": N, "queued": N,
+         "heartbeats": [{"_id": ..., "hostname": ..., "age": ..., "sample_age": ..., "stalled": ..., ...}, ...]}
+    """
+    try:
+        stale = float(request.args['stale']) if 'stale' in request.args else None
+    except ValueError:
+        return abort(400)
+    try:
+        heartbeats = list(heartbeat_collection.find({}, sort=[('date', pymongo.ASCENDING)]))
+    except pymongo.errors.OperationFailure:
+        return abort(500)
+    current = time.time()
+    summary = {"boards": len(heartbeats), "stalled": 0, "slow": 0, "queued": 0}
+    for i in heartbeats:
+        i['_id'] = str(i['_id'])
+        i['age'] = current - i['date']
+        i['sample_age'] = None if i.get('last_sample') is None else current - i['last_sample']
+        limit = stale
+        if limit is None:
+            limit = STALE_HEARTBEAT_INTERVALS*max(i.get('heartbeat_interval', 60), i.get('reading_frequency', 0))
+        i['stalled'] = i['age'] > limit or i['sample_age'] is None or i['sample_age'] > limit
+        i['slow'] = i.get('cycle_duration') is not None and i['cycle_duration'] > i.get('reading_frequency', 0)
+        summary['stalled'] += i['stalled']
+        summary['slow'] += i['slow']
+        summary['queued'] += i.get('queue_depth', 0)
+    return jsonify(date=current, heartbeats=heartbeats, **summary)
+
+
+@bp.route('/boards/<Id>/data/', methods=['GET'])
+def board_data(Id):
+    """
+    Returns the board's data between 'start' and 'end' (UNIX Epoch timestamps, defaults to the last 24
+    hours), aggregated on the server into min/max/mean buckets of 'resolution' seconds (defaults to a
+    resolution returning up to 'points' points, DATA_POINTS by default and at most MAX_DATA_POINTS). A
+    'resolution' that would return more than MAX_DATA_POINTS points is rejected.
+
+    'fields' is a comma separated list of measurement names, defaults to all measurements. Names that are not
+    measurements of the board's recent readings (see findDataFields()) are rejected.
+
+    Response format:
+        {"start": ..., "end": ..., "resolution": ..., "fields": ["Temperature", ...],
+         "data": [{"date": ..., "count": ..., "Temperature": {"min": ..., "max": ..., "mean": ...}, ...}, ...]}
+    """
+    board_info = findBoardById(Id)
+    if board_info is None:
+        return abort(404)
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 24*60*60))
+        points = min(MAX_DATA_POINTS, max(1, int(request.args.get('points', DATA_POINTS))))
+        resolution = float(request.args.get('resolution', max(1.0, (end - start)/points)))
+    except ValueError:
+        return abort(400)
+    # Comparisons written so that NaN values are rejected too
+    if not end > start or not resolution > 0 or (end - start)/resolution > MAX_DATA_POINTS:
+        return abort(400)
+    collection = client[board_info['settings']['value']['db_name']['value']][
+        board_info['settings']['value']['collection_name']['value']]
+    bucketed = isBucketed(board_info)
+    ensureDataIndex(collection, bucketed)
+    known_fields = findDataFields(collection, board_info['_id'], bucketed)
+    if 'fields' in request.args:
+        fields = [i for i in request.args['fields'].split(',') if i != '']
+        # Field names end up in aggregation expressions, operators ('$...') and paths ('a.b') are not allowed
+        for i in fields:
+            if i.startswith('$') or '.' in i or i not in known_fields:
+                return abort(400)
+    else:
+        fields = known_fields
+    if bucketed:
+        pipeline = build_bucket_data_pipeline(board_info['_id'], start, end, fields, resolution)
+    else:
+        pipeline = build_data_pipeline(start, end, fields, resolution)
+    try:
+        result = collection.aggregate(pipeline)
+    except pymongo.errors.OperationFailure:
+        return abort(500)
+    if isinstance(result, dict):  # Older pymongo versions return the whole command result
+        result = result['result']
+    data = []
+    for i in result:
+        point = {"date": i['_id'], "count": i['count']}
+        for j in range(len(fields)):
+            point[fields[j]] = {"min": i['min_' + str(j)], "max": i['max_' + str(j)], "mean": i['mean_' + str(j)]}
+        data.append(point)
+    return jsonify(start=start, end=end, resolution=resolution, fields=fields, data=data)
+
+
 @bp.route('/boards/<Id>/schema/')
 def board_schema_json(Id):
     board_info = findBoardById(Id)
     if board_info is None:
         return abort(404)
     board_info.pop("_id")
-    return json.dumps(build_schema_board(board_info))
+    contents = json.dumps(build_schema_board(board_info))
+    # Browsers revalidate with If-None-Match and skip downloading an unchanged schema
+    etag = hashlib.sha1(contents).hexdigest()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(contents)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @bp.route('/boards/<Id>/advanced/schema/')
@@ -182,76 +380,103 @@ def board_schema_json_adv(Id):
 
 # Helper functions
 def build_schema_board(board_info):
+    # The schema structure only depends on the shape of the settings (keys, titles, types and number of
+    # sensors), so it is cached by a hash of that shape, only the values are built for every board
+    shape = build_schema_shape(board_info)
+    shape_hash = hashlib.sha1(json.dumps(shape, sort_keys=True)).hexdigest()
+    if shape_hash not in schema_cache:
+        if len(schema_cache) >= SCHEMA_CACHE_SIZE:
+            schema_cache.clear()
+        schema_cache[shape_hash] = build_schema_structure(board_info)
+    string = {}
+    string['value'] = build_schema_values(board_info)
+    string['schema'] = schema_cache[shape_hash]
+    string['form'] = [
+        "settings",
+        "sensors",
+        {"type": "submit", "title": "Save"}
+    ]
+    return string
+
+
+def build_schema_shape(board_info):
+    # Returns the parts of board_info the schema structure is built from
+    shape = {}
+    for i in board_info:
+        if isinstance(board_info[i]['value'], list):
+            shape[i] = [board_info[i]['title'], board_info[i]['type'],
+                        [[(key, sensor[key]['title'], sensor[key]['type']) for key in sorted(sensor)]
+                         for sensor in board_info[i]['value']]]
+        elif isinstance(board_info[i]['value'], dict):
+            shape[i] = [board_info[i]['title'], board_info[i]['type'],
+                        [(key, board_info[i]['value'][key]['title'], board_info[i]['value'][key]['type'])
+                         for key in sorted(board_info[i]['value'])]]
+    return shape
+
+
+def build_schema_structure(board_info):
     template = {}
     template['title'] = "Board Settings"
     template['type'] = "object"
     template['properties'] = {}
-    string = {}
-    string['value'] = {}
     for i in board_info:
         if isinstance(board_info[i]['value'], list):
-            try:
-                template['properties'][i]
-            except:
-                template['properties'][str(i)] = {}
-            try:
-                string['value'][i]
-            except:
-                string['value'][str(i)] = []
+            template['properties'][str(i)] = {}
             template['properties'][i]['title'] = str(board_info[i]['title'])
             template['properties'][i]['type'] = str(board_info[i]['type'])
             arr = []
             for sensor in board_info[i]['value']:
                 entry = {}
-                sensor_value = {}
                 entry['title'] = "Sensor"
                 entry['type'] = "object"
                 entry['properties'] = {}
                 for key in sensor:
-                    entry['properties'][str(key)] = {
-                        "title": str(sensor[key]['title']),
-                        "type": str(sensor[key]['type']),
-                        "required": "true",
-                        # "default": sensor[key]['value']
-                    }
-                    # Escape line ending characters if used on read_command, prevents being resaved
-                    # incorrectly after loaded on form
-                    sensor_value[str(key)] = str(sensor[key]['value']).replace('\r', '\\r').replace('\n', '\\n')
-                string['value'][str(i)].append(sensor_value)
+                    entry['properties'][str(key)] = build_schema_property(key, sensor[key])
                 arr.append(entry)
                 # only one entry needed for schema
             template['properties'][i]['items'] = arr
 
         elif isinstance(board_info[i]['value'], dict):
-            try:
-                template['properties'][i]
-            except:
-                template['properties'][str(i)] = {}
-            try:
-                template['properties'][i]['properties']
-            except:
-                template['properties'][str(i)]['properties'] = {}
-            try:
-                string['value'][i]
-            except:
-                string['value'][str(i)] = {}
+            template['properties'][str(i)] = {}
+            template['properties'][str(i)]['properties'] = {}
             template['properties'][i]['title'] = str(board_info[i]['title'])
             template['properties'][i]['type'] = str(board_info[i]['type'])
             for sensor in board_info[i]['value']:
-                template['properties'][i]['properties'][str(sensor)] = {
-                    "title": str(board_info[i]['value'][sensor]['title']),
-                    "type": str(board_info[i]['value'][sensor]['type']),
-                    "required": "true",
-                    # "default": board_info[i]['value'][sensor]['value']
-                }
-                string['value'][str(i)][str(sensor)] = str(board_info[i]['value'][sensor]['value'])
-    string['schema'] = template
-    string['form'] = [
-        "settings",
-        "sensors",
-        {"type": "submit", "title": "Save"}
-    ]
-    return string
+                template['properties'][i]['properties'][str(sensor)] = build_schema_property(
+                    sensor, board_info[i]['value'][sensor])
+    return template
+
+
+def build_schema_property(key, entry):
+    # Optional settings may be blank, so they are not required, and typed as strings even if stored as
+    # integers (blank is not a valid integer)
+    if key in OPTIONAL_SETTINGS:
+        return {"title": str(entry['title']), "type": "string"}
+    return {
+        "title": str(entry['title']),
+        "type": str(entry['type']),
+        "required": "true",
+        # "default": entry['value']
+    }
+
+
+def build_schema_values(board_info):
+    values = {}
+    for i in board_info:
+        if isinstance(board_info[i]['value'], list):
+            values[str(i)] = []
+            for sensor in board_info[i]['value']:
+                sensor_value = {}
+                for key in sensor:
+                    # Escape line ending characters if used on read_command, prevents being resaved
+                    # incorrectly after loaded on form
+                    sensor_value[str(key)] = str(sensor[key]['value']).replace('\r', '\\r').replace('\n', '\\n')
+                values[str(i)].append(sensor_value)
+        elif isinstance(board_info[i]['value'], dict):
+            values[str(i)] = {}
+            for sensor in board_info[i]['value']:
+                values[str(i)][str(sensor)] = str(board_info[i]['value'][sensor]['value'])
+    return values
 
 # def build_schema_board_adv(board_info):
 #     template = {}
@@ -321,6 +546,8 @@ def build_settings_board(request, board_info):
         "date": time.strftime("%m/%d/%y %I:%M:%S%p"),
         "value": "Initialized"
     }
+    # The revision is incremented by updateBoardById()
+    board_info.pop('revision', None)
     board_info['settings']['value'] = {}
     board_info['sensors']['value'] = []
     # Behaviour example:
@@ -357,6 +584,127 @@ def build_settings_board(request, board_info):
     return board_info
 
 
+def build_data_pipeline(start, end, fields, resolution):
+    # Aggregation pipeline for readings stored as one document per reading
+    return [
+        {"$match": {"date": {"$gte": start, "$lt": end}}},
+        build_data_group(dict((i, "$" + fields[i] + ".value") for i in range(len(fields))), resolution),
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def build_bucket_data_pipeline(board_id, start, end, fields, resolution):
+    # Aggregation pipeline for readings stored on buckets (see insertBuckets() in rpi_service.py), requires
+    # MongoDB 3.2 or newer
+    return [
+        {"$match": {"board": ObjectId(board_id), "start": {"$lt": end}, "end": {"$gt": start}}},
+        {"$project": {"date": 1, "values": 1}},
+        {"$unwind": {"path": "$date", "includeArrayIndex": "index"}},
+        {"$match": {"date": {"$gte": start, "$lt": end}}},
+        build_data_group(dict((i, {"$arrayElemAt": ["$values." + fields[i], "$index"]}) for i in range(len(fields))),
+                         resolution),
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def build_data_group(values, resolution):
+    # $group stage of 'resolution' seconds, with min/max/mean of each value expression, keyed by field index
+    group = {"_id": {"$subtract": ["$date", {"$mod": ["$date", resolution]}]}, "count": {"$sum": 1}}
+    for i in values:
+        group['min_' + str(i)] = {"$min": values[i]}
+        group['max_' + str(i)] = {"$max": values[i]}
+        group['mean_' + str(i)] = {"$avg": values[i]}
+    return {"$group": group}
+
+
+def isBucketed(board_info):
+    try:
+        return str(board_info['settings']['value']['storage_mode']['value']).strip().lower() == 'bucket'
+    except KeyError:
+        return False
+
+
+def ensureDataIndex(collection, bucketed):
+    # Creates the index used by data queries, once per collection
+    key = (collection.database.name, collection.name, bucketed)
+    if key in indexed_collections:
+        return
+    try:
+        if bucketed:
+            collection.create_index([('board', pymongo.ASCENDING), ('start', pymongo.ASCENDING)])
+        else:
+            collection.create_index('date')
+        indexed_collections.add(key)
+    except pymongo.errors.OperationFailure:
+        pass
+
+
+def findDataFields(collection, board_id, bucketed):
+    # Returns the measurement names of the DATA_FIELDS_SAMPLE most recent readings (or buckets), as sensors read
+    # at their own frequency leave their measurements out of readings they are not due on
+    fields = set()
+    try:
+        if bucketed:
+            for i in collection.find({'board': ObjectId(board_id)}, {'fields': 1},
+                                     sort=[('start', -1)], limit=DATA_FIELDS_SAMPLE):
+                fields.update(i.get('fields', []))
+        else:
+            for i in collection.find({}, {'_id': 0}, sort=[('date', -1)], limit=DATA_FIELDS_SAMPLE):
+                fields.update(j for j in i if isinstance(i[j], dict) and 'value' in i[j])
+    except pymongo.errors.OperationFailure:
+        return []
+    return sorted(i for i in fields if not i.startswith('$') and '.' not in i)
+
+
+def listBoards(page, per_page):
+    """
+    Returns a tuple (ordered_dbs, pages) with the boards on 'page', grouped by db and sorted by hostname,
+    and the total number of pages.
+
+    Only the fields shown on the selection page are fetched, sorted by the db_name/hostname index, and
+    listings are cached for SELECTION_CACHE_TTL seconds, up to SELECTION_CACHE_SIZE of them. Pages past the
+    last one are not cached.
+
+    format: ordered_dbs = {db_1: {_id_1: {collection_name, hostname, _id, status}, ...}, ...}
+    """
+    key = (page, per_page)
+    cached = selection_cache.pop(key, None)
+    if cached is not None and time.time() - cached[0] < SELECTION_CACHE_TTL:
+        selection_cache[key] = cached  # Most recently used
+        return cached[2], cached[1]
+    ordered_dbs = collections.OrderedDict()
+    pages = 1
+    try:
+        pages = max(1, (board_collection.count() + per_page - 1)/per_page)
+        cursor = board_collection.find({}, {'settings.value.db_name.value': 1,
+                                            'settings.value.collection_name.value': 1,
+                                            'settings.value.hostname.value': 1,
+                                            'status.value': 1},
+                                        sort=[('settings.value.db_name.value', pymongo.ASCENDING),
+                                              ('settings.value.hostname.value', pymongo.ASCENDING)])
+        for i in cursor.skip((page - 1)*per_page).limit(per_page):
+            try:
+                db = i['settings']['value']['db_name']['value']
+                board = {
+                    "collection_name": i['settings']['value']['collection_name']['value'],
+                    "hostname": i['settings']['value']['hostname']['value'],
+                    "_id": i['_id'],
+                    "status": i['status']['value']
+                }
+            except KeyError:
+                continue  # Skip malformed board entries
+            if db not in ordered_dbs:
+                ordered_dbs[db] = collections.OrderedDict()
+            ordered_dbs[db][i['_id']] = board
+    except pymongo.errors.OperationFailure:
+        return ordered_dbs, pages
+    if page <= pages:
+        selection_cache[key] = (time.time(), pages, ordered_dbs)
+        while len(selection_cache) > SELECTION_CACHE_SIZE:
+            selection_cache.popitem(last=False)
+    return ordered_dbs, pages
+
+
 def findBoardById(Id):
     try:
         board_info = board_collection.find_one({'_id': ObjectId(Id)})
@@ -373,25 +721,96 @@ def removeBoardById(Id):
     try:
         board_collection.remove({'_id': ObjectId(Id)})
         log_collection.remove({'_id': ObjectId(Id)})
+        heartbeat_collection.remove({'_id': ObjectId(Id)})
+        selection_cache.clear()
         return True
     except pymongo.errors.OperationFailure:
         return False
 
 
-def findLogById(Id):
+def buildLogContents(log_info):
+    # Boards upload the log incrementally as a list of lines, older versions upload it as a single string
+    if 'lines' in log_info:
+        return '\n'.join(log_info['lines']) + '\n'
+    return log_info.get('contents', '')
+
+
+def findLogCount(Id):
+    """
+    Returns a tuple (total, stored) with the number of lines uploaded to the log of board 'Id' and the
+    number of lines still stored (see appendLogData() in rpi_service.py), or None if there is no log.
+
+    The stored lines have offsets total - stored to total - 1.
+    """
     try:
-        board_info = log_collection.find_one({'_id': ObjectId(Id)})
-        board_info.update(board_collection.find_one({'_id': ObjectId(Id)}))  # Add some required info for the log page
+        result = log_collection.aggregate([
+            {'$match': {'_id': ObjectId(Id)}},
+            {'$project': {'total': 1, 'stored': {'$size': {'$ifNull': ['$lines', []]}}}}
+        ])
+        if isinstance(result, dict):  # Older pymongo versions return the whole command result
+            result = result['result']
+        result = list(result)
+        if len(result) == 0:
+            return None
+        if result[0]['stored'] == 0:
+            # Logs uploaded by older versions as a single string
+            log_info = log_collection.find_one({'_id': ObjectId(Id)}, {'contents': 1})
+            stored = len(buildLogContents(log_info).splitlines())
+            return stored, stored
     except pymongo.errors.OperationFailure:
         return None
-    return board_info
+    return result[0].get('total', result[0]['stored']), result[0]['stored']
+
+
+def findLogLines(Id, offset, limit, total):
+    """
+    Returns a tuple (total, lines) with up to 'limit' lines starting at 'offset' of the log of board 'Id',
+    or None if there is no log.
+
+    Lines are sliced counting from the newest one, so if the returned total differs from 'total' the log
+    changed meanwhile and the lines must be fetched again.
+    """
+    try:
+        log_info = log_collection.find_one({'_id': ObjectId(Id)},
+                                           {'total': 1, 'contents': 1, 'lines': {'$slice': [offset - total, limit]}})
+    except pymongo.errors.OperationFailure:
+        return None
+    if log_info is None:
+        return None
+    if 'lines' not in log_info:
+        lines = buildLogContents(log_info).splitlines()
+        return len(lines), lines[offset:offset + limit]
+    return log_info.get('total', total), log_info['lines']
+
+
+def iterLogLines(Id, offset, end, total):
+    # Yields lists of up to LOG_CHUNK_LINES log lines, from 'offset' up to 'end'
+    while offset < end:
+        result = findLogLines(Id, offset, min(LOG_CHUNK_LINES, end - offset), total)
+        if result is None:
+            return
+        if result[0] != total:
+            if result[0] < offset:
+                return  # Log was reset
+            total = result[0]  # Log grew meanwhile, fetch again
+            continue
+        if len(result[1]) == 0:
+            return
+        offset += len(result[1])
+        yield result[1]
 
 
 def updateBoardById(Id, data):
+    # Boards check the revision to find out settings have changed, it is incremented on the server in the same
+    # update as the settings, so concurrent saves never reuse a revision number
+    update = dict((i, data[i]) for i in data if i not in ('_id', 'revision'))
+    update['revision.title'] = "Settings Revision"
+    update['revision.type'] = "info"
     try:
-        board_collection.update({'_id': ObjectId(Id)}, data)
+        board_collection.update({'_id': ObjectId(Id)}, {'$set': update, '$inc': {'revision.value': 1}})
     except pymongo.errors.OperationFailure:
         return False
+    selection_cache.clear()
     return True
 
 if __name__ == '__main__':